@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+In-process daily aggregation of tweet counts by date, language and topic
+
+Replaces the pandasql GROUP BY year, month, day queries: the corpus is
+integer coded once and counted with a single bincount per topic. Counts can
+also be kept per hour (or any other time bin) and city, and rolled up to
+coarser bins afterwards without going back to the tweets.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+# named time bins for binned_counts / rebin, in seconds; bins are counted from BIN_ORIGIN, a Monday
+# (1970-01-05 UTC), so weeks start on Mondays and hours, 6h bins and days at the usual UTC boundaries
+BIN_WIDTHS = {'hour': 3600, '6h': 6 * 3600, 'day': 86400, 'week': 7 * 86400}
+BIN_ORIGIN = 4 * 86400
+
+
+def cell_counts(flat, cells: int, hits=None):
+    # number of tweets and sum of every hits column per cell, for flat (integer) cell codes
+    n = np.bincount(flat, minlength=cells)
+
+    # hits may also hold non-indicator columns (e.g. sentiment scores); these are summed the same way,
+    # and x is only kept as floats if one of them is not integer valued
+    topics = [] if hits is None else list(hits.keys())
+    integer = all(np.issubdtype(np.asarray(hits[name]).dtype, np.integer) for name in topics)
+    x = np.zeros((cells, len(topics)), dtype=np.int64 if integer else np.float64)
+    for j, name in enumerate(topics):
+        sums = np.bincount(flat, weights=np.asarray(hits[name], dtype=np.float64), minlength=cells)
+        x[:, j] = sums.round() if integer else sums
+    return topics, n, x
+
+
+def daily_counts(df: pd.DataFrame, hits=None):
+    # count tweets (n) and topic mentions (x) per (day, language, topic) in one pass
+    # hits is a tweets x topics frame of 0/1 indicators aligned row for row with df (e.g. from topic_matrix)
+    key = df['year'].to_numpy(dtype=np.int64) * 10000 + df['month'].to_numpy(dtype=np.int64) * 100 + df['day'].to_numpy(dtype=np.int64)
+    day_codes, day_keys = pd.factorize(key, sort=True)
+    # languages in alphabetical order (not category order) so counts of separate batches line up
+    lang_codes, languages = pd.factorize(df['language'].astype(object), sort=True)
+    n_days, n_lang = len(day_keys), len(languages)
+    flat = day_codes.astype(np.int64) * n_lang + lang_codes
+
+    topics, n, x = cell_counts(flat, n_days * n_lang, hits)
+    n = n.reshape(n_days, n_lang)
+    x = x.reshape(n_days, n_lang, len(topics))
+
+    days = pd.DataFrame({
+        'year': day_keys // 10000,
+        'month': day_keys // 100 % 100,
+        'day': day_keys % 100
+        })
+    return {
+        'days': days,
+        'languages': list(languages),
+        'topics': topics,
+        'n': n,
+        'x': x
+        }
+
+
+def bin_width(width):
+    # seconds in a time bin, given as seconds or as one of BIN_WIDTHS
+    return BIN_WIDTHS[width] if isinstance(width, str) else int(width)
+
+
+def binned_counts(df: pd.DataFrame, hits=None, width='hour'):
+    # like daily_counts, per time bin of `width` (from the epoch column), city and language:
+    # {'start': epoch seconds of the first bin, 'width', 'cities', 'languages', 'topics',
+    #  'n': bins x cities x languages, 'x': bins x cities x languages x topics}, dense in time
+    width = bin_width(width)
+    bins = (df['epoch'].to_numpy(dtype=np.int64) - BIN_ORIGIN) // width
+    first = int(bins.min()) if len(bins) else 0
+    bins = bins - first
+    n_bins = int(bins.max()) + 1 if len(bins) else 0
+    city_codes, cities = pd.factorize(df['city'].astype(object), sort=True)
+    lang_codes, languages = pd.factorize(df['language'].astype(object), sort=True)
+    shape = (n_bins, len(cities), len(languages))
+    flat = (bins * shape[1] + city_codes) * shape[2] + lang_codes
+
+    topics, n, x = cell_counts(flat, n_bins * shape[1] * shape[2], hits)
+    return {
+        'start': BIN_ORIGIN + first * width,
+        'width': width,
+        'cities': list(cities),
+        'languages': list(languages),
+        'topics': topics,
+        'n': n.reshape(shape),
+        'x': x.reshape(shape + (len(topics),))
+        }
+
+
+def bin_starts(counts: dict):
+    # datetime64[s] (UTC) start of every time bin
+    return np.datetime64(counts['start'], 's') + np.arange(counts['n'].shape[0]) * np.timedelta64(counts['width'], 's')
+
+
+def rebin(counts: dict, width):
+    # the same counts in coarser time bins (e.g. hour -> 6h, day or week); width must be a multiple of the current one
+    width = bin_width(width)
+    if width % counts['width']:
+        raise ValueError("cannot rebin " + str(counts['width']) + "s bins into " + str(width) + "s bins")
+    if counts['n'].shape[0] == 0:
+        return dict(counts, width=width)
+    bins = (counts['start'] + np.arange(counts['n'].shape[0]) * counts['width'] - BIN_ORIGIN) // width
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(bins)) + 1])
+    return dict(counts,
+                start=BIN_ORIGIN + int(bins[0]) * width,
+                width=width,
+                n=np.add.reduceat(counts['n'], starts, axis=0),
+                x=np.add.reduceat(counts['x'], starts, axis=0))
+
+
+def merge_counts(a: dict, b: dict):
+    # add two binned count tables with the same bin width and topics, aligned on the union of bins, cities and languages
+    if a['topics'] != b['topics'] or a['width'] != b['width']:
+        raise ValueError("cannot merge binned counts for different topics or bin widths")
+    parts = [part for part in (a, b) if part['n'].shape[0] > 0] or [a]
+    start = min(part['start'] for part in parts)
+    end = max(part['start'] + part['n'].shape[0] * part['width'] for part in parts)
+    cities = sorted(set(a['cities']) | set(b['cities']))
+    languages = sorted(set(a['languages']) | set(b['languages']))
+    shape = ((end - start) // a['width'], len(cities), len(languages))
+    n = np.zeros(shape, dtype=np.int64)
+    x = np.zeros(shape + (len(a['topics']),), dtype=np.result_type(a['x'], b['x']))
+    for part in parts:
+        rows = (part['start'] - start) // part['width'] + np.arange(part['n'].shape[0])
+        city_cols = np.array([cities.index(c) for c in part['cities']], dtype=np.intp)
+        lang_cols = np.array([languages.index(lang) for lang in part['languages']], dtype=np.intp)
+        n[np.ix_(rows, city_cols, lang_cols)] += part['n']
+        x[np.ix_(rows, city_cols, lang_cols)] += part['x']
+    return dict(a, start=start, cities=cities, languages=languages, n=n, x=x)
+
+
+def counts_to_daily(counts: dict, city=None):
+    # daily counts (as daily_counts) from binned counts, for all cities or one city (or a list of cities);
+    # days without tweets are left out, as in daily_counts
+    day = rebin(counts, 'day')
+    keep = [k for k, c in enumerate(day['cities']) if city is None or c == city or (isinstance(city, (list, tuple)) and c in city)]
+    n = day['n'][:, keep].sum(axis=1)
+    x = day['x'][:, keep].sum(axis=1)
+    rows = n.sum(axis=1) > 0
+    dates = pd.DatetimeIndex(bin_starts(day)[rows])
+    return {
+        'days': pd.DataFrame({'year': dates.year.to_numpy(dtype=np.int64), 'month': dates.month.to_numpy(dtype=np.int64), 'day': dates.day.to_numpy(dtype=np.int64)}),
+        'languages': list(day['languages']),
+        'topics': list(day['topics']),
+        'n': n[rows],
+        'x': x[rows]
+        }
+
+
+def daily_summary(daily: dict, topic=None, language=None):
+    # same frame as "SELECT year, month, day, COUNT(*) AS n[, SUM(topic) AS x] FROM df
+    # [WHERE language = ...] GROUP BY year, month, day": days without matching rows are left out
+    if language is None:
+        n = daily['n'].sum(axis=1)
+    elif language in daily['languages']:
+        n = daily['n'][:, daily['languages'].index(language)]
+    else:
+        n = np.zeros(daily['n'].shape[0], dtype=np.int64)
+    summary = daily['days'].copy()
+    summary['n'] = n
+    if topic is not None:
+        x = daily['x'][:, :, daily['topics'].index(topic)]
+        if language is None:
+            summary['x'] = x.sum(axis=1)
+        elif language in daily['languages']:
+            summary['x'] = x[:, daily['languages'].index(language)]
+        else:
+            summary['x'] = 0
+    summary = summary[summary['n'] > 0]
+    return summary.reset_index(drop=True)
+
+
+def daily_dates(daily: dict):
+    # datetime64[D] date of every row of daily
+    d = daily['days']
+    keys = pd.to_datetime(pd.DataFrame({'year': d['year'], 'month': d['month'], 'day': d['day']}))
+    return keys.to_numpy(dtype='datetime64[D]')
+
+
+def language_counts(daily: dict, language=None):
+    # tweets per day (days) and mentions per day and topic (days x topics), overall or in one language
+    if language is None:
+        return daily['n'].sum(axis=1), daily['x'].sum(axis=1)
+    if language in daily['languages']:
+        k = daily['languages'].index(language)
+        return daily['n'][:, k], daily['x'][:, k, :]
+    return np.zeros(daily['n'].shape[0], dtype=np.int64), np.zeros(daily['x'].shape[::2], dtype=daily['x'].dtype)
+
+
+def prevalence(daily: dict, language=None):
+    # days x topics share of tweets mentioning each topic (x / n), overall or in one language;
+    # NaN on days without any (such) tweets
+    n, x = language_counts(daily, language)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        prop = x / n[:, None].astype(np.float64)
+    prop[n == 0] = np.nan
+    return prop
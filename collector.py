@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Concurrent, rate limit aware collector for the full archive search endpoint
+
+(city, hour) windows are fetched by a bounded pool of worker threads that
+share one token bucket. Every window is paginated to the end, and a 429 or an
+exhausted x-rate-limit-remaining pauses all workers until x-rate-limit-reset.
+The endpoint url is a parameter, so a local mock server can stand in for it.
+
+Progress is checkpointed: each page is streamed to its own part file and then
+recorded in an append-only journal (one line per window and pagination
+token), so a restarted pull resumes every window where it stopped, and the
+collector holds no more than one page in memory at a time.
+"""
+
+import os
+import csv
+import gzip
+import json
+import glob
+import time
+import datetime
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from twarc.expansions import ensure_flattened
+
+
+SEARCH_URL = "https://api.twitter.com/2/tweets/search/all"
+
+# academic full archive search: 300 requests per 15 minutes and at most 1 request per second
+REQUESTS_PER_SECOND = 1.0
+
+TWEET_FIELDS = "created_at,lang,geo,author_id,conversation_id,public_metrics"
+EXPANSIONS = "author_id,geo.place_id"
+
+# errors of a single request worth retrying: dropped connections, slow responses and truncated bodies
+TRANSIENT_ERRORS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+
+
+
+class TokenBucket():
+    # thread safe token bucket shared by all workers; pause_until blocks everyone until the
+    # given epoch time, which is how 429 responses and rate limit resets are honoured
+    def __init__(self, rate: float, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                wait = self.paused_until - time.time()
+                if wait <= 0:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause_until(self, epoch_seconds: float):
+        with self.lock:
+            self.paused_until = max(self.paused_until, epoch_seconds)
+
+
+def format_time(dt: datetime.datetime):
+    return dt.astimezone(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def hourly_windows(start: datetime.datetime, end: datetime.datetime):
+    # consecutive one hour (t_0, t_1) windows covering [start, end), as tweet_pulling.py has always used
+    windows = []
+    t_0 = start
+    t_1 = t_0 + datetime.timedelta(hours=1)
+    while t_1 <= end:
+        windows.append((t_0, t_1))
+        t_0 = t_0 + datetime.timedelta(hours=1)
+        t_1 = t_1 + datetime.timedelta(hours=1)
+    return windows
+
+
+def get_page(session, bucket: TokenBucket, url: str, bearer_token: str, params: dict, max_retries=8):
+    # one page of results, waiting out rate limits (which never count as failures) and
+    # retrying connection errors, timeouts, truncated or unparseable responses and server errors with exponential backoff
+    headers = {'Authorization': 'Bearer ' + bearer_token}
+    failures = 0
+    while True:
+        bucket.acquire()
+        try:
+            response = session.get(url, params=params, headers=headers, timeout=60)
+        except TRANSIENT_ERRORS:
+            failures += 1
+            if failures >= max_retries:
+                raise
+            time.sleep(min(2 ** failures, 60))
+            continue
+        reset = response.headers.get('x-rate-limit-reset')
+        if response.status_code == 429:
+            bucket.pause_until(float(reset) if reset else time.time() + 60)
+            continue
+        if response.status_code >= 500 and failures + 1 < max_retries:
+            failures += 1
+            time.sleep(min(2 ** failures, 60))
+            continue
+        response.raise_for_status()
+        if response.headers.get('x-rate-limit-remaining') == '0' and reset:
+            bucket.pause_until(float(reset))
+        try:
+            return response.json()
+        except ValueError:
+            # a body cut short or mangled on the way (requests.JSONDecodeError is a ValueError)
+            failures += 1
+            if failures >= max_retries:
+                raise
+            time.sleep(min(2 ** failures, 60))
+
+
+def fetch_window(session, bucket: TokenBucket, url: str, bearer_token: str, query: str,
+                 start: datetime.datetime, end: datetime.datetime, next_token=None, max_results=500):
+    # yield every page for one window, following next_token until the results run out
+    params = {
+        'query': query,
+        'start_time': format_time(start),
+        'end_time': format_time(end),
+        'max_results': max_results,
+        'tweet.fields': TWEET_FIELDS,
+        'expansions': EXPANSIONS
+        }
+    while True:
+        if next_token is not None:
+            params['next_token'] = next_token
+        page = get_page(session, bucket, url, bearer_token, params)
+        next_token = page.get('meta', {}).get('next_token')
+        yield page, next_token
+        if next_token is None:
+            return
+
+
+def page_tweets(page: dict):
+    # flattened tweets of a page; a page without results has no 'data' and would otherwise
+    # be mistaken by ensure_flattened for a single, already flattened tweet
+    if 'data' not in page:
+        return []
+    return ensure_flattened(page)
+
+
+def collect(windows: list, bearer_token: str, handle_page, workers=8, url=SEARCH_URL, rate=REQUESTS_PER_SECOND):
+    # fetch windows (dicts with at least 'query', 'start' and 'end') concurrently
+    # handle_page(window, page, next_token) is called from the worker threads for every page,
+    # in order within a window; it must be thread safe across windows
+    bucket = TokenBucket(rate)
+    local = threading.local()
+
+    def run(window):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        for page, next_token in fetch_window(local.session, bucket, url, bearer_token, window['query'],
+                                             window['start'], window['end'], window.get('next_token')):
+            handle_page(window, page, next_token)
+        return window
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(run, windows))
+
+
+def window_key(window: dict):
+    return window['city'] + '|' + window['bucket'] + '|' + format_time(window['start'])
+
+
+def read_journal(path: str):
+    # latest journal entry per window key; a torn last line left by a crash is ignored
+    progress = dict()
+    if not os.path.exists(path):
+        return progress
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            progress[entry['window']] = entry
+    return progress
+
+
+def pending_windows(windows: list, progress: dict):
+    # windows still to fetch; unfinished ones resume from the last journaled next_token
+    pending = []
+    for window in windows:
+        entry = progress.get(window_key(window))
+        if entry is None:
+            pending.append(window)
+        elif not entry['done']:
+            pending.append(dict(window, next_token=entry['next_token'], page=entry['page'] + 1))
+    return pending
+
+
+def window_dir(out_dir: str, window: dict):
+    return os.path.join(out_dir, window['city'] + window['bucket'])
+
+
+def part_path(out_dir: str, window: dict, page_no: int):
+    return os.path.join(window_dir(out_dir, window), window['start'].strftime('%Y%m%dT%H') + '_' + '%05d' % page_no + '.csv')
+
+
+def write_rows(path: str, columns: list, rows, buffer_rows=1000):
+    # write rows (an iterable of tuples) to a csv through a fixed size buffer, atomically
+    with open(path + '.tmp', 'w', newline='') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(columns)
+        n = 0
+        buffer = []
+        for row in rows:
+            buffer.append(row)
+            if len(buffer) >= buffer_rows:
+                writer.writerows(buffer)
+                n += len(buffer)
+                buffer = []
+        writer.writerows(buffer)
+        n += len(buffer)
+    os.replace(path + '.tmp', path)
+    return n
+
+
+def archive_page(path: str, page: dict):
+    # gzipped raw api response, kept in case fields beyond the csv columns are needed later
+    with gzip.open(path + '.tmp', 'wt', encoding='utf-8') as f:
+        json.dump(page, f, ensure_ascii=False)
+    os.replace(path + '.tmp', path)
+
+
+@contextmanager
+def journaled_handler(journal_path: str, out_dir: str, columns: list, page_rows, archive_dir=None):
+    # context manager giving a handle_page for collect() that streams each page's rows (page_rows(window, page) yields tuples
+    # matching columns) to its own part file and only then journals the page, so a page is never
+    # half recorded; a page fetched again after a crash simply overwrites its part file.
+    # Nothing is kept once a page is written, so memory does not grow with the number of windows.
+    # The journal is closed when the with block (the pull) ends.
+    lock = threading.Lock()
+    page_numbers = dict()
+    os.makedirs(os.path.dirname(os.path.abspath(journal_path)), exist_ok=True)
+    journal = open(journal_path, 'a')
+
+    def handle_page(window, page, next_token):
+        key = window_key(window)
+        with lock:
+            page_no = page_numbers.get(key, window.get('page', 0))
+            page_numbers[key] = page_no + 1
+        path = part_path(out_dir, window, page_no)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if archive_dir is not None:
+            raw_path = os.path.join(archive_dir, os.path.relpath(path, out_dir))[:-len('.csv')] + '.json.gz'
+            os.makedirs(os.path.dirname(raw_path), exist_ok=True)
+            archive_page(raw_path, page)
+        n = write_rows(path, columns, page_rows(window, page))
+        entry = {'window': key, 'page': page_no, 'next_token': next_token, 'done': next_token is None, 'rows': n}
+        with lock:
+            journal.write(json.dumps(entry) + '\n')
+            journal.flush()
+            os.fsync(journal.fileno())
+
+    try:
+        yield handle_page
+    finally:
+        journal.close()
+
+
+def window_parts(out_dir: str, window: dict):
+    # part files pulled for a window so far, in page order
+    return sorted(glob.glob(os.path.join(window_dir(out_dir, window), window['start'].strftime('%Y%m%dT%H') + '_*.csv')))
+
+
+def write_windows_csv(out_dir: str, windows: list, columns: list, path: str, buffer_rows=1000):
+    # concatenate the part files of windows (in the given order) into one csv with a leading
+    # index column, like DataFrame.to_csv, streaming rows instead of loading the parts
+    def rows():
+        i = 0
+        for window in windows:
+            for part in window_parts(out_dir, window):
+                with open(part, newline='') as f:
+                    reader = csv.reader(f)
+                    next(reader)
+                    for row in reader:
+                        yield [i] + row
+                        i += 1
+    return write_rows(path, [''] + columns, rows(), buffer_rows)
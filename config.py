@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Locations of data and derived artifacts, overridable through environment variables
+"""
+
+import os
+
+
+# raw sentiment dictionaries, as distributed
+RUSSIAN_DICTIONARY = os.environ.get('EMOTIONS_RUSSIAN_DICTIONARY', 'russian_dictionary.csv')
+UKRAINIAN_DICTIONARY = os.environ.get('EMOTIONS_UKRAINIAN_DICTIONARY', 'ukrainian_dictionary.txt')
+
+# compiled lexicons built from them by `python lexicon.py build`
+LEXICON_DIR = os.environ.get('EMOTIONS_LEXICON_DIR', 'lexicons')
+
+# persistent word -> stem tables kept by stemming.py
+STEM_DIR = os.environ.get('EMOTIONS_STEM_DIR', 'stems')
+
+# serialized bag-of-words corpora and trained topic models (LDA.ipynb, topic_models.py)
+MODEL_DIR = os.environ.get('EMOTIONS_MODEL_DIR', 'models')
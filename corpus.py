@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Streaming loader and on-disk cache for the raw city/bucket tweet csvs under data/
+
+Each file is read in chunks; every chunk is cleaned, deduplicated and
+annotated with city, pull (bucket), language, time (epoch seconds and date)
+and word count, then appended to an Arrow IPC file, so peak memory depends on
+the chunk size rather than the archive size.
+The Arrow file doubles as a cache that is memory mapped on later loads and
+only rebuilt when one of the source csvs changes (or, through ingest.py, has
+new rows appended to it). corpus_table hands out the
+mapped table itself; only the rows and columns a caller asks for are copied
+into a dataframe (corpus_frame).
+"""
+
+import os
+import json
+import uuid
+import hashlib
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from concurrent.futures import ProcessPoolExecutor
+from parallel import bounded_map
+from preprocessing import clean_df, assign_language, assign_date, assign_word_counts, LANGUAGE_LABELS
+
+
+city_prefixes = ['R1', 'R2', 'R3', 'U1', 'U2', 'U3']
+buckets = ['prewar', 'during', 'postwar']
+
+# city of each file prefix (the place: queries in tweet_pulling.py)
+CITIES = {
+    'R1': 'Moscow',
+    'R2': 'St. Petersburg',
+    'R3': 'Novosibirsk',
+    'U1': 'Kyiv',
+    'U2': 'Kharkiv',
+    'U3': 'Odesa'
+    }
+CITY_LABELS = tuple(CITIES[prefix] for prefix in city_prefixes)
+
+# bump whenever the cleaning/annotation or the schema below changes, so old caches are rebuilt
+CORPUS_VERSION = 4
+
+CORPUS_SCHEMA = pa.schema([
+    ('timestamp', pa.string()),
+    ('epoch', pa.int64()),
+    ('text', pa.string()),
+    ('city', pa.dictionary(pa.int8(), pa.string())),
+    ('bucket', pa.dictionary(pa.int8(), pa.string())),
+    ('language', pa.dictionary(pa.int8(), pa.string())),
+    ('date', pa.date32()),
+    ('year', pa.int16()),
+    ('month', pa.int8()),
+    ('day', pa.int8()),
+    ('num_words', pa.int32())
+    ])
+
+
+
+def source_files(data_dir="data"):
+    # (bucket, path) for every raw csv, in the order load_data has always read them
+    return [(bucket, source_path(data_dir, prefix, bucket)) for bucket in buckets for prefix in city_prefixes]
+
+
+def source_path(data_dir: str, prefix: str, bucket: str):
+    return os.path.join(data_dir, prefix + bucket + ".csv")
+
+
+def read_chunks(path: str, bucket: str, chunksize: int):
+    # the 'during' pull has embedded carriage returns, so only split lines on \n
+    if bucket == 'during':
+        return pd.read_csv(path, chunksize=chunksize, lineterminator='\n')
+    return pd.read_csv(path, chunksize=chunksize)
+
+
+def drop_seen(df: pd.DataFrame, seen: set):
+    # keep the first occurrence of each (timestamp, text) pair, remembering only a 64 bit hash of each row
+    hashes = pd.util.hash_pandas_object(df[['timestamp', 'text']], index=False).to_numpy()
+    keep = np.zeros(len(hashes), dtype=bool)
+    for i, h in enumerate(hashes.tolist()):
+        if h not in seen:
+            seen.add(h)
+            keep[i] = True
+    return df[keep].reset_index(drop=True)
+
+
+def annotate_chunk(item):
+    # (bucket, city, raw chunk) -> (bucket, cleaned and annotated chunk); duplicates are dropped afterwards
+    # in the parent, which is equivalent because every annotation only depends on its own row
+    bucket, city, chunk = item
+    df = clean_df(chunk).drop(columns = ['location'])
+    if df.empty:
+        return bucket, df
+    df['city'] = city
+    df['bucket'] = bucket
+    df = assign_language(df)
+    df = assign_date(df)
+    df = assign_word_counts(df)
+    return bucket, df
+
+
+def raw_chunks(data_dir: str, chunksize: int):
+    # the city comes from the file, as the location column holds the query's place name
+    for bucket in buckets:
+        for prefix in city_prefixes:
+            for chunk in read_chunks(source_path(data_dir, prefix, bucket), bucket, chunksize):
+                yield bucket, CITIES[prefix], chunk
+
+
+def to_arrow(df: pd.DataFrame):
+    # typed record batch for an annotated chunk; language, city and bucket are dictionary encoded against the fixed
+    # LANGUAGE_LABELS, CITY_LABELS and buckets so every batch shares one dictionary, and the date is stored as date32
+    lang_codes = pd.Categorical(df['language'], categories=LANGUAGE_LABELS).codes
+    city_codes = pd.Categorical(df['city'], categories=CITY_LABELS).codes
+    bucket_codes = pd.Categorical(df['bucket'], categories=buckets).codes
+    dates = pd.to_datetime(pd.DataFrame({'year': df['year'], 'month': df['month'], 'day': df['day']}))
+    epoch_days = (dates - pd.Timestamp(1970, 1, 1)).dt.days.to_numpy(dtype=np.int32)
+    return pa.table({
+        'timestamp': pa.array(df['timestamp'].astype(object), pa.string()),
+        'epoch': pa.array(df['epoch'].to_numpy(dtype=np.int64)),
+        'text': pa.array(df['text'].astype(object), pa.string()),
+        'city': pa.DictionaryArray.from_arrays(pa.array(city_codes, pa.int8()), pa.array(CITY_LABELS, pa.string())),
+        'bucket': pa.DictionaryArray.from_arrays(pa.array(bucket_codes, pa.int8()), pa.array(buckets, pa.string())),
+        'language': pa.DictionaryArray.from_arrays(pa.array(lang_codes, pa.int8()), pa.array(LANGUAGE_LABELS, pa.string())),
+        'date': pa.array(epoch_days, pa.int32()).cast(pa.date32()),
+        'year': pa.array(df['year'].to_numpy(dtype=np.int16)),
+        'month': pa.array(df['month'].to_numpy(dtype=np.int8)),
+        'day': pa.array(df['day'].to_numpy(dtype=np.int8)),
+        'num_words': pa.array(df['num_words'].to_numpy(dtype=np.int32))
+        }, schema=CORPUS_SCHEMA)
+
+
+def stream_corpus(sink: str, data_dir="data", chunksize=100000, workers=1):
+    # write the cleaned, deduplicated and annotated corpus to sink (Arrow IPC file) and return its path
+    # as before, duplicates are only dropped within a bucket, not across prewar/during/postwar
+    # with workers > 1 chunks are cleaned and annotated in a process pool; the file is the same either way
+    tmp = sink + ".tmp"
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        annotated = map(annotate_chunk, raw_chunks(data_dir, chunksize)) if pool is None else \
+            bounded_map(pool, annotate_chunk, raw_chunks(data_dir, chunksize), 2 * workers)
+        # a new generation id tells what is derived row by row from the cache (see token_index.corpus_index)
+        # that the file was rewritten rather than appended to
+        schema = CORPUS_SCHEMA.with_metadata({'generation': uuid.uuid4().hex})
+        with pa.OSFile(tmp, 'wb') as out, pa.ipc.new_file(out, schema) as writer:
+            current, seen = None, set()
+            for bucket, df in annotated:
+                if bucket != current:
+                    current, seen = bucket, set()
+                df = drop_seen(df, seen)
+                if df.empty:
+                    continue
+                writer.write_table(to_arrow(df))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    os.replace(tmp, sink)
+    return sink
+
+
+def append_corpus(path: str, tables: list):
+    # append annotated tables (see to_arrow) to the corpus cache, keeping its generation: the existing
+    # record batches are copied as they are, not decoded, since an Arrow IPC file cannot grow in place
+    tmp = path + ".tmp"
+    reader = pa.ipc.open_file(pa.memory_map(path, 'r'))
+    with pa.OSFile(tmp, 'wb') as out, pa.ipc.new_file(out, reader.schema) as writer:
+        for i in range(reader.num_record_batches):
+            writer.write_batch(reader.get_batch(i))
+        for table in tables:
+            writer.write_table(table)
+    os.replace(tmp, path)
+    return path
+
+
+def corpus_generation(path: str):
+    # (generation id, number of rows) of the corpus cache
+    reader = pa.ipc.open_file(pa.memory_map(path, 'r'))
+    metadata = reader.schema.metadata or {}
+    rows = sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+    return metadata.get(b'generation', b'').decode(), rows
+
+
+def file_sha256(path: str):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_manifest(data_dir="data", previous=None):
+    # size, mtime and content hash of every source csv; a file whose size and mtime match
+    # the previous manifest is not hashed again
+    previous = (previous or {}).get('files', {})
+    files = dict()
+    for bucket, path in source_files(data_dir):
+        st = os.stat(path)
+        entry = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+        old = previous.get(path)
+        if old is not None and old['size'] == entry['size'] and old['mtime_ns'] == entry['mtime_ns']:
+            entry['sha256'] = old['sha256']
+        else:
+            entry['sha256'] = file_sha256(path)
+        files[path] = entry
+    return {'version': CORPUS_VERSION, 'files': files}
+
+
+def cache_is_fresh(previous, current):
+    # only the content hashes decide: touching a csv without changing it does not force a rebuild
+    if previous is None or previous.get('version') != CORPUS_VERSION:
+        return False
+    if previous['files'].keys() != current['files'].keys():
+        return False
+    return all(previous['files'][p]['sha256'] == current['files'][p]['sha256'] for p in current['files'])
+
+
+def read_corpus_table(path: str):
+    # memory mapped read: column buffers stay in the page cache instead of being copied onto the heap
+    return pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+
+
+def corpus_cache_path(cache_dir="data/cache"):
+    return os.path.join(cache_dir, "corpus.arrow")
+
+
+def read_manifest(cache_dir="data/cache"):
+    # the manifest of the source csvs the corpus cache was built from, or None if there is no cache
+    manifest_path = os.path.join(cache_dir, "manifest.json")
+    if not (os.path.exists(manifest_path) and os.path.exists(corpus_cache_path(cache_dir))):
+        return None
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def write_manifest(cache_dir: str, manifest: dict):
+    manifest_path = os.path.join(cache_dir, "manifest.json")
+    with open(manifest_path + ".tmp", 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+
+def corpus_table(data_dir="data", cache_dir="data/cache", chunksize=100000, workers=1):
+    # the cleaned, annotated corpus as a memory mapped Arrow table, rebuilding the cache only if a source csv changed
+    os.makedirs(cache_dir, exist_ok=True)
+    cache_path = corpus_cache_path(cache_dir)
+    previous = read_manifest(cache_dir)
+    current = source_manifest(data_dir, previous)
+    if not cache_is_fresh(previous, current):
+        stream_corpus(cache_path, data_dir=data_dir, chunksize=chunksize, workers=workers)
+    if current != previous:
+        write_manifest(cache_dir, current)
+    return read_corpus_table(cache_path)
+
+
+def rows_where(table: pa.Table, column: str, value):
+    # row numbers of the tweets whose column equals value (e.g. rows_where(table, 'bucket', 'prewar')),
+    # without copying the table
+    return np.flatnonzero(pc.equal(table.column(column), value).to_numpy(zero_copy_only=False))
+
+
+def corpus_frame(table: pa.Table, rows=None, columns=None):
+    # dataframe of the given rows (all if None, in the order given) and columns (all if None) of the corpus
+    # table; only those are copied out of the memory mapped cache
+    if columns is not None:
+        table = table.select(columns)
+    if rows is not None:
+        table = table.take(pa.array(np.asarray(rows, dtype=np.int64)))
+    return table.to_pandas(date_as_object=False)
+
+
+def load_corpus(data_dir="data", cache_dir="data/cache", chunksize=100000, workers=1, rows=None, columns=None):
+    # the cleaned, annotated corpus (or only the given rows and columns) as a dataframe; see corpus_table
+    return corpus_frame(corpus_table(data_dir, cache_dir, chunksize, workers), rows, columns)
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Persisted cube of counts by time bin, city, language and topic
+
+The cached corpus is scored once (see parallel.parallel_counts) into hourly
+counts of tweets, topic mentions and sentiment scores per city and language,
+and the cube is stored next to the corpus cache. Slicing, rolling up to
+coarser bins and proportions are array operations on the cube, so graphs,
+recovery coefficients or a dashboard never need the tweets in memory. The
+cube file also keeps the ledger of (city, hour) windows it counts, so newly
+pulled windows are merged into it (see ingest.py); it is rebuilt only when
+the corpus cache is rebuilt or the topics or sentiment dictionaries change.
+"""
+
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+from aggregation import bin_width, bin_starts, rebin
+from corpus import CITY_LABELS, corpus_cache_path, read_corpus_table
+from lexicon import lexicon_path
+from parallel import parallel_counts
+
+
+# bump whenever the cube layout changes, so old cubes are rebuilt
+CUBE_VERSION = 2
+
+
+
+def cube_key(topics: dict, dictionaries=None):
+    # digest of everything the counts depend on besides the corpus: the stems of every topic and the
+    # sentiment dictionaries (a compiled lexicon by the size and time of its file, a dict by its contents)
+    lexicons = {}
+    for language, d in (dictionaries or {}).items():
+        if isinstance(d, str):
+            st = os.stat(lexicon_path(d))
+            lexicons[language] = [d, st.st_size, st.st_mtime_ns]
+        else:
+            lexicons[language] = sorted(d.items())
+    spec = json.dumps([CUBE_VERSION, topics, lexicons], ensure_ascii=False, default=str)
+    return hashlib.sha1(spec.encode('utf-8')).hexdigest()
+
+
+def hour_windows(epoch, city_codes):
+    # ledger key of the (city, hour) window of every tweet: the hour since the epoch times the number
+    # of cities plus the city's position in corpus.CITY_LABELS
+    return (np.asarray(epoch, dtype=np.int64) // 3600) * len(CITY_LABELS) + np.asarray(city_codes, dtype=np.int64)
+
+
+def table_windows(table):
+    # sorted distinct windows of a corpus table (every batch encodes the city against CITY_LABELS, see corpus.to_arrow)
+    codes = [chunk.indices.to_numpy(zero_copy_only=False) for chunk in table.column('city').chunks]
+    return np.unique(hour_windows(table.column('epoch').to_numpy(), np.concatenate([np.zeros(0, dtype=np.int64)] + codes)))
+
+
+def counts_arrays(counts: dict, prefix: str):
+    # arrays to np.savez for one table of binned counts (see aggregation.binned_counts)
+    return {
+        prefix + 'start': np.array(counts['start'], dtype=np.int64),
+        prefix + 'width': np.array(counts['width'], dtype=np.int64),
+        prefix + 'cities': np.array(counts['cities'], dtype=str),
+        prefix + 'languages': np.array(counts['languages'], dtype=str),
+        prefix + 'topics': np.array(counts['topics'], dtype=str),
+        prefix + 'n': counts['n'],
+        prefix + 'x': counts['x']
+        }
+
+
+def read_counts_arrays(f, prefix: str):
+    return {
+        'start': int(f[prefix + 'start']),
+        'width': int(f[prefix + 'width']),
+        'cities': f[prefix + 'cities'].tolist(),
+        'languages': f[prefix + 'languages'].tolist(),
+        'topics': f[prefix + 'topics'].tolist(),
+        'n': f[prefix + 'n'],
+        'x': f[prefix + 'x']
+        }
+
+
+def save_cube(cube: dict, path: str, **extra):
+    # topic counts and (if scored) sentiment sums in one file, with extra arrays alongside
+    arrays = counts_arrays(cube['topics'], 'topics_')
+    if cube['sentiment'] is not None:
+        arrays.update(counts_arrays(cube['sentiment'], 'sentiment_'))
+    tmp = path + ".tmp.npz"
+    np.savez(tmp, **arrays, **extra)
+    os.replace(tmp, path)
+
+
+def read_cube_arrays(f):
+    return {
+        'topics': read_counts_arrays(f, 'topics_'),
+        'sentiment': read_counts_arrays(f, 'sentiment_') if 'sentiment_n' in f else None
+        }
+
+
+def load_cube(path: str):
+    # everything a dashboard needs: the corpus itself is not touched
+    with np.load(path) as f:
+        return read_cube_arrays(f)
+
+
+def cube_path(cache_dir="data/cache"):
+    return os.path.join(cache_dir, "cube.npz")
+
+
+def cache_source(cache_dir="data/cache"):
+    # size and mtime of the corpus cache, stored with the cube to tell whether it still counts that file
+    st = os.stat(corpus_cache_path(cache_dir))
+    return np.array([st.st_size, st.st_mtime_ns], dtype=np.int64)
+
+
+def store_cube(cube: dict, cache_dir: str, topics: dict, dictionaries, windows):
+    # save the cube of the current corpus cache with its ledger of windows
+    save_cube(cube, cube_path(cache_dir), source=cache_source(cache_dir), key=np.array(cube_key(topics, dictionaries)),
+              windows=windows)
+
+
+def cube_windows(cache_dir="data/cache"):
+    # the ledger of (city, hour) windows (see hour_windows) counted in the stored cube
+    with np.load(cube_path(cache_dir)) as f:
+        return f['windows']
+
+
+def corpus_cube(cache_dir="data/cache", topics=None, dictionaries=None, workers=None):
+    # {'topics': hourly topic counts, 'sentiment': hourly sentiment sums or None} per city and language
+    # for the cached corpus, stored at cache_dir/cube.npz; scored again (in shards, on all cores)
+    # whenever the corpus cache has been rewritten or the topics or dictionaries differ
+    path = cube_path(cache_dir)
+    key = cube_key(topics, dictionaries)
+    if os.path.exists(path):
+        with np.load(path) as f:
+            if 'source' in f and np.array_equal(f['source'], cache_source(cache_dir)) and str(f['key']) == key:
+                return read_cube_arrays(f)
+
+    cache_path = corpus_cache_path(cache_dir)
+    counts, sentiment = parallel_counts(cache_path, topics, dictionaries, workers)
+    cube = {'topics': counts, 'sentiment': sentiment}
+    store_cube(cube, cache_dir, topics, dictionaries, table_windows(read_corpus_table(cache_path)))
+    return cube
+
+
+def to_epoch(time):
+    # epoch seconds of a date / datetime (string, datetime or datetime64); naive times are UTC
+    stamp = pd.Timestamp(time)
+    if stamp.tzinfo is None:
+        stamp = stamp.tz_localize('UTC')
+    return int((stamp - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(seconds=1))
+
+
+def names_at(names: list, wanted):
+    # positions of wanted (None for all, one name or a list of names) in names; unknown names are skipped
+    if wanted is None:
+        return np.arange(len(names))
+    if isinstance(wanted, str):
+        wanted = [wanted]
+    return np.array([names.index(name) for name in wanted if name in names], dtype=np.intp)
+
+
+def at_width(counts: dict, width=None):
+    # the counts in bins of width (None keeps them as they are); roll-ups are kept with the counts,
+    # so asking for daily or weekly figures again costs nothing
+    if width is None or bin_width(width) == counts['width']:
+        return counts
+    width = bin_width(width)
+    rollups = counts.setdefault('rollups', {})
+    if width not in rollups:
+        rollups[width] = rebin({key: value for key, value in counts.items() if key != 'rollups'}, width)
+    return rollups[width]
+
+
+def select(counts: dict, start=None, end=None, cities=None, languages=None, topics=None):
+    # sub-cube of the bins starting in [start, end) and the given cities, languages and topics
+    # (None for all, one name or a list of names)
+    rows = np.arange(counts['n'].shape[0])
+    if start is not None:
+        rows = rows[rows >= -(-(to_epoch(start) - counts['start']) // counts['width'])]
+    if end is not None:
+        rows = rows[rows < -(-(to_epoch(end) - counts['start']) // counts['width'])]
+    c = names_at(counts['cities'], cities)
+    k = names_at(counts['languages'], languages)
+    j = names_at(counts['topics'], topics)
+    first = int(rows[0]) if len(rows) else 0
+    return {
+        'start': counts['start'] + first * counts['width'],
+        'width': counts['width'],
+        'cities': [counts['cities'][i] for i in c],
+        'languages': [counts['languages'][i] for i in k],
+        'topics': [counts['topics'][i] for i in j],
+        'n': counts['n'][np.ix_(rows, c, k)],
+        'x': counts['x'][np.ix_(rows, c, k, j)]
+        }
+
+
+def totals(counts: dict, width=None, city=None, language=None):
+    # bin start times, tweets per bin (bins) and mentions or summed scores per bin and topic (bins x topics),
+    # rolled up to width and summed over the given cities and languages (None for all)
+    counts = at_width(counts, width)
+    c = names_at(counts['cities'], city)
+    k = names_at(counts['languages'], language)
+    n = counts['n'][:, c][:, :, k].sum(axis=(1, 2))
+    x = counts['x'][:, c][:, :, k].sum(axis=(1, 2))
+    return bin_starts(counts), n, x
+
+
+def proportion(counts: dict, topic=None, width=None, city=None, language=None):
+    # bin start times and share of tweets mentioning each topic (bins x topics, or bins for one topic),
+    # or the mean score per tweet for sentiment counts; NaN for bins without any (such) tweets
+    starts, n, x = totals(counts, width, city, language)
+    if topic is not None:
+        x = x[:, counts['topics'].index(topic)]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        prop = x / (n[:, None] if x.ndim == 2 else n).astype(np.float64)
+    prop[n == 0] = np.nan
+    return starts, prop
+
+
+def language_shares(counts: dict, width=None, city=None):
+    # bin start times and share of each language among the tweets of every bin (bins x languages);
+    # NaN for bins without tweets
+    counts = at_width(counts, width)
+    c = names_at(counts['cities'], city)
+    n = counts['n'][:, c].sum(axis=1)
+    total = n.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        shares = n / total[:, None].astype(np.float64)
+    shares[total == 0] = np.nan
+    return bin_starts(counts), shares
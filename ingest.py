@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Incremental ingestion of newly pulled tweets into the corpus cache and its cube
+
+The cube of hourly counts (see cube.py) keeps a ledger of every (city, hour)
+window it counts. Ingesting only reads the source csvs whose contents changed
+since the cache was last brought up to date (see corpus.source_manifest),
+skips the rows of windows in the ledger and appends the rest, cleaned and
+annotated as in corpus.stream_corpus, to the corpus cache. Their hourly topic
+counts and sentiment sums per city and language are merged into the cube and
+the ledger grows by their windows, saved in the same file, so the two can
+never disagree; the token index, if one has been built, gets their postings
+appended (see token_index.corpus_index). The cost of an update is
+proportional to the new data; the corpus and the cube are only rebuilt when
+there is no cache yet, and the cube when the topics or dictionaries change.
+"""
+
+import os
+import numpy as np
+import pyarrow.compute as pc
+from corpus import (CITIES, CITY_LABELS, CORPUS_VERSION, buckets, city_prefixes, source_path, read_chunks, annotate_chunk,
+                    drop_seen, to_arrow, append_corpus, corpus_cache_path, corpus_table, corpus_frame, read_corpus_table,
+                    read_manifest, write_manifest, source_manifest)
+from cube import corpus_cube, cube_windows, hour_windows, store_cube
+from token_index import corpus_index
+from aggregation import binned_counts, merge_counts
+from topic_matching import topic_matrix, topic_words
+from sentiment import score_sentiment
+from lexicon import load_lexicon
+
+
+
+def changed_sources(data_dir: str, previous: dict, current: dict):
+    # (bucket, prefix) of every source csv whose contents differ from the previous manifest, in load order
+    changed = []
+    for bucket in buckets:
+        for prefix in city_prefixes:
+            path = source_path(data_dir, prefix, bucket)
+            if previous['files'].get(path, {}).get('sha256') != current['files'][path]['sha256']:
+                changed.append((bucket, prefix))
+    return changed
+
+
+def seed_seen(table, in_bucket, table_hours, hours, seeded: set, seen: set):
+    # add to seen the (timestamp, text) hashes of the cached tweets of the bucket (in_bucket: row mask) in the given
+    # hours not seeded yet, so a new tweet that is already in the corpus (e.g. from another city) is dropped
+    # as a full rebuild would; only those hours' rows are read
+    hours = np.setdiff1d(hours, np.fromiter(seeded, dtype=np.int64, count=len(seeded)))
+    if not len(hours):
+        return
+    seeded.update(hours.tolist())
+    rows = np.flatnonzero(in_bucket & np.isin(table_hours, hours))
+    drop_seen(corpus_frame(table, rows, ['timestamp', 'text']), seen)
+
+
+def ingest_windows(topics: dict, dictionaries=None, data_dir="data", cache_dir="data/cache", chunksize=100000, workers=None):
+    # bring the corpus cache and its cube (see cube.corpus_cube) up to date with the source csvs and return the cube,
+    # appending the tweets of every (city, hour) window not ingested before
+    # duplicates (same timestamp and text) within a bucket are dropped, as in corpus.stream_corpus, except that a copy
+    # already in the corpus is the one kept; a window is assumed complete once ingested, so pull whole hours before
+    # ingesting them
+    previous = read_manifest(cache_dir)
+    if previous is None or previous.get('version') != CORPUS_VERSION:
+        corpus_table(data_dir, cache_dir, chunksize)
+        return corpus_cube(cache_dir, topics, dictionaries, workers)
+
+    current = source_manifest(data_dir, previous)
+    cube = corpus_cube(cache_dir, topics, dictionaries, workers)
+    changed = changed_sources(data_dir, previous, current)
+    if not changed:
+        if current != previous:
+            write_manifest(cache_dir, current)
+        return cube
+
+    windows = cube_windows(cache_dir)
+    # words matched against the topics so far; each chunk only matches the words it adds
+    matched = topic_words(topics)
+    lexicons = {lang: load_lexicon(d) if isinstance(d, str) else d for lang, d in (dictionaries or {}).items()}
+    table = read_corpus_table(corpus_cache_path(cache_dir))
+    table_hours = table.column('epoch').to_numpy() // 3600
+    tables, new_windows, counts, sentiment = [], [], None, None
+    for bucket in buckets:
+        in_bucket = pc.equal(table.column('bucket'), bucket).to_numpy(zero_copy_only=False)
+        seen, seeded = set(), set()
+        for prefix in [prefix for b, prefix in changed if b == bucket]:
+            code = CITY_LABELS.index(CITIES[prefix])
+            for chunk in read_chunks(source_path(data_dir, prefix, bucket), bucket, chunksize):
+                _, df = annotate_chunk((bucket, CITIES[prefix], chunk))
+                if df.empty:
+                    continue
+                df = df[~np.isin(hour_windows(df['epoch'], code), windows)].reset_index(drop=True)
+                seed_seen(table, in_bucket, table_hours, np.unique(df['epoch'].to_numpy(dtype=np.int64) // 3600), seeded, seen)
+                df = drop_seen(df, seen)
+                if df.empty:
+                    continue
+                tables.append(to_arrow(df))
+                new_windows.append(hour_windows(df['epoch'], code))
+                part = binned_counts(df, topic_matrix(df['text'], topics, matched), 'hour')
+                counts = part if counts is None else merge_counts(counts, part)
+                if lexicons:
+                    part = binned_counts(df, score_sentiment(df['text'], df['language'], lexicons), 'hour')
+                    sentiment = part if sentiment is None else merge_counts(sentiment, part)
+
+    if tables:
+        append_corpus(corpus_cache_path(cache_dir), tables)
+        cube = {
+            'topics': merge_counts(cube['topics'], counts),
+            'sentiment': None if cube['sentiment'] is None else merge_counts(cube['sentiment'], sentiment)
+            }
+        store_cube(cube, cache_dir, topics, dictionaries, np.union1d(windows, np.concatenate(new_windows)))
+        if os.path.exists(os.path.join(cache_dir, "index.npz")):
+            corpus_index(cache_dir)
+    write_manifest(cache_dir, current)
+    return cube
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compiled sentiment lexicons
+
+The Russian and Ukrainian sentiment dictionaries are compiled once into Arrow
+files holding a sorted word table and a parallel score array. Loading one is
+a memory map, so it takes no time and every process scoring tweets shares the
+same read-only pages.
+
+Build them with
+
+    python lexicon.py build [--russian russian_dictionary.csv] [--ukrainian ukrainian_dictionary.txt] [--out lexicons]
+
+(defaults come from config.py and can be set through the environment).
+"""
+
+import os
+import argparse
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import config
+
+
+LEXICON_SCHEMA = pa.schema([
+    ('word', pa.string()),
+    ('score', pa.float64())
+    ])
+
+
+
+def read_russian_dictionary(path: str):
+    # csv with word and score columns; a word listed twice keeps its last score
+    russian_dict = pd.read_csv(path)
+    return dict(zip(russian_dict['word'], russian_dict['score']))
+
+
+def read_ukrainian_dictionary(path: str):
+    # whitespace separated "word score" lines; a word listed twice keeps its last score
+    ukr_dict = dict()
+    with open(path) as file:
+        for line in file:
+            t = line.strip().split()
+            if len(t) >= 2:
+                ukr_dict[t[0]] = int(t[1])
+    return ukr_dict
+
+
+def write_lexicon(dictionary: dict, path: str):
+    words = sorted(dictionary.keys())
+    table = pa.table({
+        'word': pa.array(words, pa.string()),
+        'score': pa.array(np.array([dictionary[w] for w in words], dtype=np.float64))
+        }, schema=LEXICON_SCHEMA)
+    with pa.OSFile(path + '.tmp', 'wb') as out, pa.ipc.new_file(out, LEXICON_SCHEMA) as writer:
+        writer.write_table(table)
+    os.replace(path + '.tmp', path)
+    return path
+
+
+def lexicon_path(name: str, lexicon_dir=None):
+    return os.path.join(lexicon_dir or config.LEXICON_DIR, name + '.arrow')
+
+
+def load_lexicon(name: str, lexicon_dir=None):
+    # memory mapped word/score table for 'russian' or 'ukrainian'
+    path = lexicon_path(name, lexicon_dir)
+    if not os.path.exists(path):
+        raise FileNotFoundError(path + " not found; build the lexicons first with `python lexicon.py build`")
+    return pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+
+
+def lookup(lexicon, words):
+    # scores of words, NaN where a word is not in the lexicon; lexicon is a compiled table or a plain dict
+    if isinstance(lexicon, dict):
+        return pd.Series(words, dtype=object).map(lexicon).to_numpy(dtype=np.float64)
+    positions = pc.index_in(pa.array(pd.Series(words, dtype=object), pa.string()), value_set=lexicon['word'])
+    scores = lexicon['score'].combine_chunks().take(pc.fill_null(positions, 0)).to_numpy(zero_copy_only=False)
+    return np.where(positions.is_valid().to_numpy(zero_copy_only=False), scores, np.nan)
+
+
+def build(russian: str, ukrainian: str, out: str):
+    os.makedirs(out, exist_ok=True)
+    write_lexicon(read_russian_dictionary(russian), lexicon_path('russian', out))
+    write_lexicon(read_ukrainian_dictionary(ukrainian), lexicon_path('ukrainian', out))
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compile the sentiment dictionaries into memory mappable lexicons")
+    commands = parser.add_subparsers(dest='command', required=True)
+    build_cmd = commands.add_parser('build', help="build russian.arrow and ukrainian.arrow")
+    build_cmd.add_argument('--russian', default=config.RUSSIAN_DICTIONARY, help="Russian dictionary csv (word, score)")
+    build_cmd.add_argument('--ukrainian', default=config.UKRAINIAN_DICTIONARY, help="Ukrainian dictionary txt (word score per line)")
+    build_cmd.add_argument('--out', default=config.LEXICON_DIR, help="output directory")
+    args = parser.parse_args()
+    if args.command == 'build':
+        build(args.russian, args.ukrainian, args.out)
+        print("Wrote lexicons to " + args.out)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Multi-process execution for the per-tweet work
+
+The cached corpus (see corpus.py) is split into row range shards. The topic
+stems are matched once against the vocabulary of the corpus' shared tokens
+(see tokens.corpus_tokens); each worker memory maps the cache and the token
+ids itself, scores its shard for topics (a lookup of its token ids) and
+sentiment, and sends back only the small per-hour, city and language partial
+counts, which are merged in shard order. Shards are a fixed number of rows,
+whatever the number of workers, and the merge order is fixed, so results are
+the same on every run and for any number of workers; with workers=1 the same
+shards are scored in-process (serial mode).
+"""
+
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pyarrow as pa
+from scipy import sparse
+from topic_matching import vocabulary_topics, topic_hits
+from aggregation import binned_counts, merge_counts
+from sentiment import score_sentiment
+from lexicon import load_lexicon
+
+
+# rows per shard; shard boundaries (and so the order float sums are added in) must not depend on the workers
+SHARD_ROWS = 50000
+
+
+def bounded_map(pool, fn, items, window: int):
+    # like pool.map, in order, but never more than `window` items in flight,
+    # so a long stream of inputs (e.g. csv chunks) is not read into memory up front
+    pending = deque()
+    for item in items:
+        pending.append(pool.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def shard_ranges(n_rows: int, n_shards: int):
+    bounds = [n_rows * k // n_shards for k in range(n_shards + 1)]
+    return [(bounds[k], bounds[k + 1]) for k in range(n_shards)]
+
+
+def score_shard(args):
+    # hourly topic counts and (optionally) sentiment sums per city and language for rows [start, stop)
+    # of the corpus cache; member is the (sparse) vocabulary x topics membership of the stored tokens' words,
+    # dictionaries map a language to a lexicon name (loaded, memory mapped, in the worker) or a dict
+    # (tokens imports corpus, which imports this module, hence the import here)
+    from tokens import read_token_rows
+    path, start, stop, names, member, dictionaries = args
+    columns = ['epoch', 'city', 'language'] + (['text'] if dictionaries else [])
+    table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all().slice(start, stop - start)
+    df = table.select(columns).to_pandas()
+    indptr, ids = read_token_rows(os.path.dirname(path), start, stop)
+    occurs = sparse.csr_matrix((np.ones(len(ids), dtype=np.int32), ids, indptr), shape=(stop - start, member.shape[0]))
+    counts = binned_counts(df, topic_hits(occurs, member, names), 'hour')
+    if not dictionaries:
+        return counts, None
+    lexicons = {lang: load_lexicon(d) if isinstance(d, str) else d for lang, d in dictionaries.items()}
+    return counts, binned_counts(df, score_sentiment(df['text'], df['language'], lexicons), 'hour')
+
+
+def parallel_counts(cache_path: str, topics: dict, dictionaries=None, workers=None, n_shards=None):
+    # (hourly topic counts, hourly sentiment sums or None) per city and language for the whole cached
+    # corpus, scored in shards; see aggregation.binned_counts, and aggregation.rebin for coarser bins.
+    # cache_path is corpus.corpus_cache_path(cache_dir); the shared tokens are kept next to it
+    from tokens import corpus_tokens
+    workers = workers or os.cpu_count() or 1
+    tokens = corpus_tokens(os.path.dirname(cache_path))
+    member = sparse.csr_matrix(vocabulary_topics(tokens['vocab'], topics))
+    n_rows = len(tokens['indptr']) - 1
+    n_shards = n_shards or max(-(-n_rows // SHARD_ROWS), 1)
+    tasks = [(cache_path, start, stop, list(topics.keys()), member, dictionaries)
+             for start, stop in shard_ranges(n_rows, n_shards)]
+
+    if workers == 1:
+        parts = map(score_shard, tasks)
+        return merge_parts(parts)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return merge_parts(pool.map(score_shard, tasks))
+
+
+def merge_parts(parts):
+    counts, sentiment = None, None
+    for part_counts, part_sentiment in parts:
+        counts = part_counts if counts is None else merge_counts(counts, part_counts)
+        if part_sentiment is not None:
+            sentiment = part_sentiment if sentiment is None else merge_counts(sentiment, part_sentiment)
+    return counts, sentiment
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Text preprocessing shared by topic_persistence.py and LDA.ipynb
+
+Everything here works on a whole text column at once rather than row by row.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+russian_only_chars = 'ёъыэ'
+ukrainian_only_chars = 'ґєії'
+ukr_or_russ_chars = 'абвгдежзийклмнопрстуфхцчшщьюя'
+
+LANGUAGE_LABELS = ('Russian', 'Ukrainian', 'Ukr/Russ', 'Other')
+
+
+
+def clean_text(texts: pd.Series):
+    # lowercase and strip punctuation (LDA.ipynb's clean_data), for the whole column at once;
+    # object dtype keeps .str.replace on Python's re, where \w also covers Cyrillic letters
+    return pd.Series(texts).astype(str).astype(object).str.lower().str.replace(r'[^\w\s]', '', regex=True)
+
+
+def clean_df(df: pd.DataFrame):
+    # lowercase and strip punctuation, keeping only the timestamp, text and location columns
+    text = clean_text(df['text'])
+    df_out = pd.DataFrame({
+        'timestamp': df['timestamp'].to_numpy(),
+        'text': text.to_numpy(),
+        'location': df['location'].to_numpy()
+        })
+    return df_out
+
+
+def classify_language(texts: pd.Series, labels=LANGUAGE_LABELS):
+    # assign a language based on characters known to be exclusively in Ukrainian and Russian
+    # priority is Russian > Ukrainian > Ukr/Russ > Other, as in the original per-row check;
+    # each pass only looks at the tweets the previous passes left undecided
+    texts = pd.Series(texts).reset_index(drop=True)
+    lang = np.full(len(texts), 3, dtype=np.int8)
+    undecided = np.arange(len(texts))
+    for code, chars in enumerate((russian_only_chars, ukrainian_only_chars, ukr_or_russ_chars)):
+        if len(undecided) == 0:
+            break
+        found = texts.iloc[undecided].str.contains('[' + chars + ']', regex=True, na=False).to_numpy(dtype=bool)
+        lang[undecided[found]] = code
+        undecided = undecided[~found]
+    return np.asarray(labels, dtype=object)[lang]
+
+
+def assign_language(df: pd.DataFrame):
+    df['language'] = classify_language(df['text'])
+    return df
+
+
+def parse_timestamps(timestamps: pd.Series):
+    # ISO 8601 created_at strings (e.g. 2022-02-24T05:00:00.000Z) to UTC datetimes, in one vectorized pass
+    return pd.to_datetime(pd.Series(timestamps).astype(object), utc=True, format='ISO8601')
+
+
+def assign_date(df: pd.DataFrame):
+    # parse the timestamps once: epoch seconds (UTC) for any finer time bins, and the calendar
+    # date (UTC) the daily counts use
+    parsed = parse_timestamps(df['timestamp'])
+    df['epoch'] = ((parsed - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(seconds=1)).to_numpy(dtype=np.int64)
+    df['year'] = parsed.dt.year.to_numpy(dtype=np.int64)
+    df['month'] = parsed.dt.month.to_numpy(dtype=np.int64)
+    df['day'] = parsed.dt.day.to_numpy(dtype=np.int64)
+    return df
+
+def assign_word_counts(df: pd.DataFrame):
+    df['num_words'] = df['text'].str.split().str.len().to_numpy()
+    return df
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Recovery coefficients of topic prevalence for many series at once
+
+Values are a days x ... array of daily prevalences (e.g. days x topics, or
+days x languages x topics) with one date per row. Windows are half-open
+[start, end) date ranges, so the analysis does not depend on which rows the
+pull happens to start with. Window means come from a single cumulative sum,
+so sweeping many baseline and peak windows for a sensitivity analysis only
+costs a few array operations per window.
+"""
+
+import numpy as np
+import pandas as pd
+from aggregation import daily_dates, prevalence
+from rolling import window_sums
+
+
+# the windows R has always been measured over on the 2021-11-24 .. 2022-05-02 pull: rows [:68] (before the
+# build-up), [92:100] (the first week of the invasion) and [-7:] (the last week), R measured up to 2022-05-02
+BASELINE = ('2021-11-24', '2022-01-31')
+PEAK = ('2022-02-24', '2022-03-04')
+CURRENT = ('2022-04-26', '2022-05-03')
+AS_OF = '2022-05-02'
+
+RESULTS = ('baseline', 'extreme', 'extreme_date', 'shock', 'current', 'R', 'kind')
+
+
+
+def to_day(date):
+    return np.datetime64(pd.Timestamp(date).date(), 'D')
+
+
+def window_rows(dates, window):
+    # (first row, end row) of the dates (sorted datetime64[D]) in [start, end)
+    return int(np.searchsorted(dates, to_day(window[0]))), int(np.searchsorted(dates, to_day(window[1])))
+
+
+def window_mean(csum, ccount, rows):
+    # mean of the non-missing values in rows [start, end) from the cumulative sums of window_sums
+    start, end = rows
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(ccount[end] - ccount[start] > 0, (csum[end] - csum[start]) / (ccount[end] - ccount[start]), np.nan)
+
+
+def window_extremes(values, rows):
+    # (max, date row of max, min, date row of min) over rows [start, end), first occurrence, ignoring NaN
+    start, end = rows
+    block = values[start:end]
+    shape = values.shape[1:]
+    if end <= start:
+        nan, zero = np.full(shape, np.nan), np.zeros(shape, dtype=np.int64)
+        return nan, zero, nan, zero
+    missing = np.isnan(block)
+    high = np.where(missing, -np.inf, block)
+    low = np.where(missing, np.inf, block)
+    arg_high, arg_low = high.argmax(axis=0), low.argmin(axis=0)
+    empty = missing.all(axis=0)
+    top = np.where(empty, np.nan, np.take_along_axis(high, arg_high[None], axis=0)[0])
+    bottom = np.where(empty, np.nan, np.take_along_axis(low, arg_low[None], axis=0)[0])
+    return top, start + arg_high, bottom, start + arg_low
+
+
+def cumulative(values):
+    # running sums and counts of the non-missing values, with a leading row of zeros
+    n = values.shape[0]
+    rows = np.arange(n + 1)
+    csum, ccount = window_sums(values, np.zeros(n + 1, dtype=np.int64), rows)
+    return csum, ccount
+
+
+def recovery_from(values, dates, csum, ccount, baseline, peak, current, as_of, kind):
+    base = window_mean(csum, ccount, window_rows(dates, baseline))
+    latest = window_mean(csum, ccount, window_rows(dates, current))
+    top, arg_top, bottom, arg_bottom = window_extremes(values, window_rows(dates, peak))
+
+    # 'auto' takes whichever extreme moved further from the baseline
+    kind = np.broadcast_to(np.asarray(kind, dtype=object), values.shape[1:])
+    auto = np.abs(top - base) >= np.abs(bottom - base)
+    use_max = (kind == 'max') | ((kind == 'auto') & auto)
+    extreme = np.where(use_max, top, bottom)
+    extreme_date = dates[np.where(use_max, arg_top, arg_bottom)] if len(dates) else \
+        np.full(values.shape[1:], np.datetime64('NaT'), dtype='datetime64[D]')
+    delta = (to_day(as_of) - extreme_date).astype(np.float64)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        shock = 100 * (extreme - base) / base
+        R = ((extreme - latest) / (extreme - base)) * 30 / delta
+    return {
+        'baseline': base,
+        'extreme': extreme,
+        'extreme_date': extreme_date,
+        'shock': shock,
+        'current': latest,
+        'R': R,
+        'kind': np.where(use_max, 'max', 'min')
+        }
+
+
+def recovery(values, dates, baseline=BASELINE, peak=PEAK, current=CURRENT, as_of=AS_OF, kind='auto'):
+    # baseline mean, extreme in the peak window ('max', 'min' or 'auto', per series or for all),
+    # shock (% change from baseline), current mean and R for every series of values (days x ...) at once:
+    # R = (extreme - current) / (extreme - baseline) * 30 / (days from the extreme to as_of)
+    values = np.asarray(values, dtype=np.float64)
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    csum, ccount = cumulative(values)
+    return recovery_from(values, dates, csum, ccount, baseline, peak, current, as_of, kind)
+
+
+def recovery_sweep(values, dates, baselines: list, peaks: list, current=CURRENT, as_of=AS_OF, kind='auto'):
+    # recovery for every (baseline window, peak window) pair: each result has shape
+    # (len(baselines), len(peaks)) + values.shape[1:], from one cumulative sum of the values
+    values = np.asarray(values, dtype=np.float64)
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    csum, ccount = cumulative(values)
+    runs = [[recovery_from(values, dates, csum, ccount, b, p, current, as_of, kind) for p in peaks] for b in baselines]
+    return {key: np.array([[run[key] for run in row] for row in runs]) for key in RESULTS}
+
+
+def recovery_table(daily: dict, languages=(None, 'Russian', 'Ukrainian'), kind='auto', **windows):
+    # one row per (topic, language) of the daily counts (see aggregation.daily_counts) with every result,
+    # language None being all tweets; windows are passed on to recovery
+    dates = daily_dates(daily)
+    keep = daily['n'].sum(axis=1) > 0
+    values = np.stack([prevalence(daily, language)[keep] for language in languages], axis=1)
+    results = recovery(values, dates[keep], kind=kind, **windows)
+    names = np.broadcast_to(np.asarray(daily['topics'], dtype=object), values.shape[1:])
+    labels = np.broadcast_to(np.asarray(['all' if l is None else l for l in languages], dtype=object)[:, None], values.shape[1:])
+    table = pd.DataFrame({'topic': names.ravel(), 'language': labels.ravel()})
+    for key in RESULTS:
+        table[key] = results[key].ravel()
+    return table
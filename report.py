@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Batch topic report: prevalence figures and recovery coefficients for every topic
+
+The daily counts (see aggregation.daily_counts) are turned into prevalence
+series for all topics and languages in one pass; every figure is then drawn
+to a PNG in a process pool, and the recovery coefficients are collected into
+one table, written as csv and as an HTML page showing all the figures.
+"""
+
+import os
+import html
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from matplotlib.figure import Figure
+from aggregation import prevalence
+from recovery import recovery_table
+from resampling import recovery_intervals, prevalence_interval
+
+
+INVASION = {'date': datetime(year=2022, month=2, day=24), 'label': 'Invasion Date (2/24)', 'color': 'red'}
+NEW_YEARS_EVE = {'date': datetime(year=2021, month=12, day=31), 'label': "New Year's Eve", 'color': 'purple'}
+
+# (key, language in the daily counts, column name in topic_persistence.topic_prevalence, legend label, line width, colour)
+SERIES = (
+    ('all', None, 'prevalence', "Russian and Ukrainian", 3, 'green'),
+    ('russian', 'Russian', 'prevalence_russian', "Russian only", 0.5, 'red'),
+    ('ukrainian', 'Ukrainian', 'prevalence_ukrainian', "Ukrainian only", 0.5, 'blue')
+    )
+
+
+
+def prevalence_series(daily: dict):
+    # dates and {series key: days x topics prevalence (x / n)} for every topic at once;
+    # days without any tweets are left out, days without tweets in one language are NaN for it
+    keep = daily['n'].sum(axis=1) > 0
+    days = daily['days'][keep]
+    dates = [datetime(year=int(y), month=int(m), day=int(d)) for y, m, d in zip(days['year'], days['month'], days['day'])]
+    series = {key: prevalence(daily, language)[keep] for key, language, _, _, _, _ in SERIES}
+    return dates, series
+
+
+def topic_kinds(spec: dict):
+    # 'max', 'min', 'auto' (or None to skip) for each of the three series; one value applies to all three
+    kind = spec.get('kind', 'max')
+    return tuple(kind) if isinstance(kind, (tuple, list)) else (kind,) * len(SERIES)
+
+
+def render_figure(job: dict):
+    # draw one topic's figure to job['path'], without pyplot so it is safe in a worker process
+    spec = job['spec']
+    fig = Figure()
+    ax = fig.add_subplot()
+    for (key, _, _, label, width, colour), values in zip(SERIES, job['values']):
+        ax.plot(job['dates'], values, label=label, linewidth=width, color=colour)
+    if job.get('band') is not None:
+        ax.fill_between(job['dates'], job['band'][0], job['band'][1], color=SERIES[0][5], alpha=0.2, linewidth=0,
+                        label='%g%% interval' % (100 * job['level']))
+    for event in job['events']:
+        ax.vlines(x=event['date'], ymin=0, ymax=spec.get('marker_height', 0.02), colors=event['color'],
+                  label=event['label'], linestyles='dashed')
+    ax.set_xlabel('Date')
+    ax.set_ylabel('Proportion')
+    ax.set_title(spec['title'])
+    if spec.get('ylim') is not None:
+        ax.set_ylim(spec['ylim'])
+    ax.legend(loc=spec.get('legend', 'upper left'))
+    fig.autofmt_xdate()
+    fig.savefig(job['path'], dpi=job['dpi'])
+    return job['path']
+
+
+def write_html(path: str, report: dict, table: pd.DataFrame):
+    rows = ['<html><head><meta charset="utf-8"><title>Topic report</title></head><body>',
+            '<h1>Topic report</h1>',
+            '<h2>Recovery coefficients</h2>',
+            table.to_html(index=False, float_format=lambda v: '%.4g' % v, na_rep=''),
+            ]
+    for name, spec in report.items():
+        rows.append('<h2>' + html.escape(spec['title']) + '</h2>')
+        rows.append('<img src="' + html.escape(name) + '.png">')
+    rows.append('</body></html>')
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        f.write('\n'.join(rows) + '\n')
+    os.replace(path + '.tmp', path)
+
+
+def recovery_report(daily: dict, report: dict, replicates=0, level=0.95, workers=None, **windows):
+    # recovery coefficients of every topic and series in report at once (see recovery.recovery_table),
+    # with bootstrap intervals if replicates > 0 (see resampling.recovery_intervals);
+    # series whose kind is None are left out
+    names = list(report.keys())
+    subset = dict(daily, topics=names, x=daily['x'][:, :, [daily['topics'].index(name) for name in names]])
+    kinds = [topic_kinds(report[name]) for name in names]
+    kind = np.array([[k or 'auto' for k in row] for row in kinds], dtype=object).T
+    languages = [language for _, language, _, _, _, _ in SERIES]
+    if replicates:
+        table = recovery_intervals(subset, replicates, level, languages, kind, workers=workers, **windows)
+    else:
+        table = recovery_table(subset, languages, kind, **windows)
+
+    # recovery_table lists every topic for one language after the other; report them topic by topic
+    table['language'] = [key for key, _, _, _, _, _ in SERIES for _ in names]
+    rows = [s * len(names) + j for j in range(len(names)) for s in range(len(SERIES)) if kinds[j][s] is not None]
+    return table.iloc[rows].reset_index(drop=True)
+
+
+def topic_report(daily: dict, report: dict, events=(INVASION,), out_dir="report", workers=None, dpi=100,
+                 bands=True, replicates=0, level=0.95, **windows):
+    # render every topic in report ({topic: {'title', 'kind', 'marker_height', 'ylim', 'legend', 'events'}},
+    # in the order given) to out_dir/<topic>.png, plus recovery.csv and index.html; returns the recovery table.
+    # events are the markers on every figure, a topic's own 'events' are added to them;
+    # bands shades a binomial interval around the overall prevalence, replicates > 0 adds bootstrap
+    # intervals to the table; windows (baseline, peak, current, as_of) are passed on to recovery.recovery
+    os.makedirs(out_dir, exist_ok=True)
+    dates, series = prevalence_series(daily)
+    keep = daily['n'].sum(axis=1) > 0
+    low, high = prevalence_interval(daily, None, level) if bands else (None, None)
+
+    jobs = []
+    for name, spec in report.items():
+        j = daily['topics'].index(name)
+        jobs.append({
+            'path': os.path.join(out_dir, name + '.png'),
+            'dates': dates,
+            'values': [series[key][:, j] for key, _, _, _, _, _ in SERIES],
+            'events': list(events) + list(spec.get('events', [])),
+            'band': (low[keep, j], high[keep, j]) if bands else None,
+            'level': level,
+            'spec': spec,
+            'dpi': dpi
+            })
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        list(map(render_figure, jobs))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(render_figure, jobs))
+
+    table = recovery_report(daily, report, replicates, level, workers, **windows)
+    table.to_csv(os.path.join(out_dir, 'recovery.csv'), index=False)
+    write_html(os.path.join(out_dir, 'index.html'), report, table)
+    return table
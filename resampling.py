@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Confidence intervals for daily prevalences and recovery coefficients
+
+Everything is resampled from the per-day counts (see aggregation.daily_counts),
+never from the tweets: the number of tweets mentioning a topic on a day in a
+language is redrawn as Binomial(n, x / n), so a replicate of the whole
+analysis is a handful of array operations. Replicates are generated in
+blocks, each from its own seed, and the blocks run in a process pool; the
+result depends only on the seed, not on the number of workers.
+"""
+
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from scipy.stats import norm
+from aggregation import daily_dates, language_counts
+from recovery import recovery, recovery_table
+
+
+STATISTICS = ('baseline', 'extreme', 'shock', 'current', 'R')
+
+
+
+def wilson_interval(x, n, level=0.95):
+    # (low, high) binomial (Wilson score) interval for the proportion x / n, elementwise; NaN where n == 0
+    z = norm.ppf(0.5 + level / 2)
+    x = np.asarray(x, dtype=np.float64)
+    n = np.asarray(n, dtype=np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        p = x / n
+        denom = 1 + z ** 2 / n
+        centre = (p + z ** 2 / (2 * n)) / denom
+        half = z * np.sqrt(p * (1 - p) / n + z ** 2 / (4 * n ** 2)) / denom
+    missing = n == 0
+    return np.where(missing, np.nan, centre - half), np.where(missing, np.nan, centre + half)
+
+
+def prevalence_interval(daily: dict, language=None, level=0.95):
+    # (low, high) days x topics Wilson interval around each daily prevalence, overall or in one language
+    n, x = language_counts(daily, language)
+    return wilson_interval(x, n[:, None], level)
+
+
+def resample_prevalence(daily: dict, languages, rng, replicates: int):
+    # days x replicates x languages x topics resampled prevalences, language None being all tweets;
+    # mentions are redrawn per (day, language, topic) and summed for the overall series
+    n = daily['n']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        p = np.where(n[:, :, None] > 0, daily['x'] / np.maximum(n, 1)[:, :, None], 0.0)
+    x = rng.binomial(n[:, None, :, None], p[:, None, :, :], size=(n.shape[0], replicates) + p.shape[1:])
+    series = []
+    for language in languages:
+        if language is None:
+            n_l, x_l = n.sum(axis=1), x.sum(axis=2)
+        elif language in daily['languages']:
+            k = daily['languages'].index(language)
+            n_l, x_l = n[:, k], x[:, :, k, :]
+        else:
+            n_l, x_l = np.zeros(n.shape[0], dtype=np.int64), np.zeros(x.shape[:2] + x.shape[3:])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            prop = x_l / n_l[:, None, None].astype(np.float64)
+        prop[n_l == 0] = np.nan
+        series.append(prop)
+    return np.stack(series, axis=2)
+
+
+def recovery_block(args):
+    # recovery statistics (replicates x languages x topics each) for one block of replicates
+    daily, languages, seed, replicates, kinds, windows = args
+    rng = np.random.default_rng(seed)
+    keep = daily['n'].sum(axis=1) > 0
+    values = resample_prevalence(daily, languages, rng, replicates)[keep]
+    results = recovery(values, daily_dates(daily)[keep], kind=kinds, **windows)
+    return {key: results[key] for key in STATISTICS}
+
+
+def recovery_intervals(daily: dict, replicates=2000, level=0.95, languages=(None, 'Russian', 'Ukrainian'), kind='auto',
+                       seed=0, block=250, workers=None, **windows):
+    # recovery_table (see recovery.py) with a bootstrap percentile interval (<statistic>_low, <statistic>_high)
+    # for every statistic; each replicate keeps the extreme (max / min) chosen for the point estimate
+    table = recovery_table(daily, languages, kind, **windows)
+    shape = (len(languages), len(daily['topics']))
+    kinds = table['kind'].to_numpy(dtype=object).reshape(shape)
+
+    sizes = [min(block, replicates - start) for start in range(0, replicates, block)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(daily, languages, s, size, kinds, windows) for s, size in zip(seeds, sizes)]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) == 1:
+        blocks = list(map(recovery_block, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+            blocks = list(pool.map(recovery_block, tasks))
+
+    alpha = (1 - level) / 2
+    for key in STATISTICS:
+        samples = np.concatenate([b[key] for b in blocks], axis=0)
+        with warnings.catch_warnings():
+            # series without a defined statistic (e.g. no tweets in the baseline window) stay NaN
+            warnings.simplefilter('ignore', RuntimeWarning)
+            low, high = np.nanquantile(samples, [alpha, 1 - alpha], axis=0) if len(samples) else (np.full(shape, np.nan),) * 2
+        table[key + '_low'] = np.asarray(low).ravel()
+        table[key + '_high'] = np.asarray(high).ravel()
+    return table
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Vectorized rolling statistics over daily series
+
+Values are a 1-D series or a 2-D days x series array (e.g. one column per
+topic), so many series and window sizes are smoothed at once from a single
+cumulative sum. Missing days (NaN) are skipped, like pandas' mean().
+"""
+
+import numpy as np
+
+
+
+def window_sums(values, starts, ends):
+    # sum and count of non-missing values over rows [starts, ends) for every row, from cumulative sums
+    values = np.asarray(values, dtype=np.float64)
+    present = ~np.isnan(values)
+    zero = np.zeros((1,) + values.shape[1:])
+    csum = np.concatenate([zero, np.cumsum(np.where(present, values, 0.0), axis=0)])
+    ccount = np.concatenate([zero, np.cumsum(present, axis=0)])
+    return csum[ends] - csum[starts], ccount[ends] - ccount[starts]
+
+
+def masked_mean(sums, counts, valid):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(counts > 0, sums / np.where(counts > 0, counts, 1), np.nan)
+    valid = valid.reshape((-1,) + (1,) * (mean.ndim - 1))
+    return np.where(valid, mean, np.nan)
+
+
+def trailing_mean(values, days: int):
+    # mean of the previous `days` rows, not including the current one; the first `days` rows are NaN
+    # (same window as moving_average in topic_persistence.py)
+    n = np.asarray(values).shape[0]
+    rows = np.arange(n)
+    starts = np.clip(rows - days, 0, n)
+    sums, counts = window_sums(values, starts, rows)
+    return masked_mean(sums, counts, rows >= days)
+
+
+def centered_mean(values, days: int):
+    # mean of the `days` rows around the current one (rows i - days//2 .. i - days//2 + days - 1,
+    # as pandas' rolling(days, center=True)); rows without a full window are NaN
+    n = np.asarray(values).shape[0]
+    rows = np.arange(n)
+    starts = rows - days // 2
+    ends = starts + days
+    valid = (starts >= 0) & (ends <= n)
+    sums, counts = window_sums(values, np.clip(starts, 0, n), np.clip(ends, 0, n))
+    return masked_mean(sums, counts, valid)
+
+
+def ewm_mean(values, span: float):
+    # exponentially weighted mean with alpha = 2 / (span + 1), y_t = alpha x_t + (1 - alpha) y_{t-1}
+    # (pandas' ewm(span, adjust=False, ignore_na=True)); a missing day carries the previous value forward
+    values = np.asarray(values, dtype=np.float64)
+    alpha = 2.0 / (span + 1.0)
+    out = np.empty_like(values)
+    prev = np.full(values.shape[1:], np.nan)
+    for t in range(values.shape[0]):
+        x = values[t]
+        prev = np.where(np.isnan(prev), x, np.where(np.isnan(x), prev, alpha * x + (1 - alpha) * prev))
+        out[t] = prev
+    return out
+
+
+def rolling_means(values, windows=(3, 7, 14), kind='trailing'):
+    # {window: smoothed array} for several window sizes at once
+    smooth = {'trailing': trailing_mean, 'centered': centered_mean, 'ewm': ewm_mean}[kind]
+    return {days: smooth(values, days) for days in windows}
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Dictionary based sentiment scoring of the whole corpus in one batch
+
+Tweets are tokenized once into a sparse tweets x vocabulary count matrix;
+each sentiment dictionary becomes a score vector over the same vocabulary,
+so positive, negative and net scores for every tweet come out of a single
+sparse matrix product instead of per-token dictionary lookups.
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from lexicon import lookup
+
+
+
+def count_matrix(texts: pd.Series):
+    # tweets x vocabulary token counts for whitespace tokenized (already cleaned) texts
+    tokens = pd.Series(texts).reset_index(drop=True).astype(object).str.split()
+    lengths = tokens.str.len().fillna(0).to_numpy(dtype=np.int64)
+    flat = tokens.explode().dropna()
+    token_ids, vocab = pd.factorize(flat)
+    indptr = np.concatenate([[0], np.cumsum(lengths)])
+    counts = sparse.csr_matrix((np.ones(len(token_ids), dtype=np.float64), token_ids, indptr),
+                               shape=(len(tokens), len(vocab)))
+    return counts, vocab
+
+
+def dictionary_vectors(scores):
+    # vocabulary x 3 matrix of [score, is positive, is negative] from per word scores (NaN = not listed)
+    scores = np.nan_to_num(scores, nan=0.0)
+    return np.column_stack([scores, scores > 0, scores < 0]).astype(np.float64)
+
+
+def score_sentiment(texts: pd.Series, languages: pd.Series, dictionaries: dict):
+    # per tweet positive and negative word counts and net score (sum of word scores),
+    # using the dictionary for the tweet's language, e.g. {'Russian': russ_dict, 'Ukrainian': ukr_dict},
+    # where each is a compiled lexicon (lexicon.load_lexicon) or a plain word -> score dict.
+    # Tweets that could be either ('Ukr/Russ') use both dictionaries, Russian taking precedence
+    # where they overlap; tweets in any other language score 0.
+    counts, vocab = count_matrix(texts)
+    languages = pd.Series(languages).reset_index(drop=True).astype(object)
+    scores = {name: lookup(dictionaries[name], vocab) for name in dictionaries}
+    if 'Ukr/Russ' not in scores and 'Russian' in scores and 'Ukrainian' in scores:
+        scores['Ukr/Russ'] = np.where(np.isnan(scores['Russian']), scores['Ukrainian'], scores['Russian'])
+
+    names = list(scores.keys())
+    vectors = np.hstack([dictionary_vectors(scores[name]) for name in names]) if names else np.zeros((len(vocab), 0))
+    scored = np.asarray(counts @ vectors)
+
+    out = np.zeros((counts.shape[0], 3), dtype=np.float64)
+    for k, name in enumerate(names):
+        rows = (languages == name).to_numpy()
+        out[rows] = scored[rows, 3 * k:3 * k + 3]
+    result = pd.DataFrame({
+        'positive': out[:, 1].astype(np.int64),
+        'negative': out[:, 2].astype(np.int64),
+        'score': out[:, 0]
+        }, index=texts.index if isinstance(texts, pd.Series) else None)
+    return result
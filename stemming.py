@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Memoized stemming of token ids for the Russian and Ukrainian LDA corpora
+
+Every distinct word is stemmed once: stems are kept in a persistent word/stem
+table per language (sorted Arrow files under config.STEM_DIR, memory mapped
+like the lexicons), which grows with every new word seen and is shared by all
+runs and corpora. Stemming a tokenized corpus (see tokens.py) is then a
+lookup of its vocabulary and one array indexing step from token ids to stem
+ids.
+"""
+
+import os
+import re
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from nltk.stem.snowball import SnowballStemmer
+import config
+
+
+STEM_SCHEMA = pa.schema([
+    ('word', pa.string()),
+    ('stem', pa.string())
+    ])
+
+# the rules of UkrainianStemmer (https://github.com/Amice13/ukr_stemmer/blob/master/ukr_stemmer3.py),
+# as used in LDA.ipynb, compiled once instead of for every token
+UK_VOWEL = re.compile(r'[аеиоуюяіїє]')
+UK_PERFECTIVE_GROUND = re.compile(r'(ив|ивши|ившись|ыв|ывши|ывшись((?<=[ая])(в|вши|вшись)))$')
+UK_REFLEXIVE = re.compile(r'(с[яьи])$')
+UK_ADJECTIVE = re.compile(r'(ими|ій|ий|а|е|ова|ове|ів|є|їй|єє|еє|я|ім|ем|им|ім|их|іх|ою|йми|іми|у|ю|ого|ому|ої)$')
+UK_PARTICIPLE = re.compile(r'(ий|ого|ому|им|ім|а|ій|у|ою|ій|і|их|йми|их)$')
+UK_VERB = re.compile(r'(сь|ся|ив|ать|ять|у|ю|ав|али|учи|ячи|вши|ши|е|ме|ати|яти|є)$')
+UK_NOUN = re.compile(r'(а|ев|ов|е|ями|ами|еи|и|ей|ой|ий|й|иям|ям|ием|ем|ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я|і|ові|ї|ею|єю|ою|є|еві|ем|єм|ів|їв|ю)$')
+UK_DERIVATIONAL = re.compile(r'[^аеиоуюяіїє][аеиоуюяіїє]+[^аеиоуюяіїє]+[аеиоуюяіїє].*(?<=о)сть?$')
+UK_I = re.compile(r'и$')
+UK_OST = re.compile(r'ость$')
+UK_SOFT = re.compile(r'ь$')
+UK_SUPERLATIVE = re.compile(r'ейше?$')
+UK_NN = re.compile(r'нн$')
+
+
+
+def strip(pattern, rv: str, to=''):
+    # (rv with pattern replaced, whether it changed)
+    new = pattern.sub(to, rv)
+    return new, new != rv
+
+
+def ukrainian_stem(word: str):
+    # the same stem as UkrainianStemmer(word).stem_word()
+    word = word.lower().replace("'", "").replace("ё", "е").replace("ъ", "ї")
+    p = UK_VOWEL.search(word)
+    if p is None:
+        return word
+    start, rv = word[:p.end()], word[p.end():]
+
+    # Step 1
+    rv, done = strip(UK_PERFECTIVE_GROUND, rv)
+    if not done:
+        rv, _ = strip(UK_REFLEXIVE, rv)
+        rv, adjective = strip(UK_ADJECTIVE, rv)
+        if adjective:
+            rv, _ = strip(UK_PARTICIPLE, rv)
+        else:
+            rv, verb = strip(UK_VERB, rv)
+            if not verb:
+                rv, _ = strip(UK_NOUN, rv)
+    # Step 2
+    rv, _ = strip(UK_I, rv)
+    # Step 3
+    if UK_DERIVATIONAL.search(rv):
+        rv, _ = strip(UK_OST, rv)
+    # Step 4
+    rv, soft = strip(UK_SOFT, rv)
+    if soft:
+        rv, _ = strip(UK_SUPERLATIVE, rv)
+        rv, _ = strip(UK_NN, rv, 'н')
+    return start + rv
+
+
+def stemmer(language: str):
+    # word -> stem function for 'russian' (nltk's Snowball, created once) or 'ukrainian'
+    if language == 'russian':
+        return SnowballStemmer("russian").stem
+    if language == 'ukrainian':
+        return ukrainian_stem
+    raise ValueError("no stemmer for " + language)
+
+
+def stem_path(language: str, stem_dir=None):
+    return os.path.join(stem_dir or config.STEM_DIR, language + '.arrow')
+
+
+def load_stem_table(language: str, stem_dir=None):
+    # memory mapped word/stem table, sorted by word; empty if nothing has been stemmed yet
+    path = stem_path(language, stem_dir)
+    if not os.path.exists(path):
+        return STEM_SCHEMA.empty_table()
+    return pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+
+
+def write_stem_table(words, stems, path: str):
+    order = np.argsort(words, kind='stable')
+    table = pa.table({
+        'word': pa.array(words[order], pa.string()),
+        'stem': pa.array(stems[order], pa.string())
+        }, schema=STEM_SCHEMA)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with pa.OSFile(path + '.tmp', 'wb') as out, pa.ipc.new_file(out, STEM_SCHEMA) as writer:
+        writer.write_table(table)
+    os.replace(path + '.tmp', path)
+
+
+def stems_of(language: str, words, stem_dir=None):
+    # stems of distinct words: looked up in the stored table, and the words not in it yet are stemmed
+    # (once each) and added to it
+    words = np.asarray(words, dtype=object)
+    table = load_stem_table(language, stem_dir)
+    positions = pc.index_in(pa.array(words, pa.string()), value_set=table['word'])
+    found = positions.is_valid().to_numpy(zero_copy_only=False)
+    stems = np.empty(len(words), dtype=object)
+    if found.any():
+        known = table['stem'].combine_chunks().take(pc.fill_null(positions, 0)).to_numpy(zero_copy_only=False)
+        stems[found] = known[found]
+    if not found.all():
+        stem = stemmer(language)
+        stems[~found] = [stem(word) for word in words[~found]]
+        write_stem_table(np.concatenate([table['word'].to_numpy().astype(object), words[~found]]),
+                         np.concatenate([table['stem'].to_numpy().astype(object), stems[~found]]),
+                         stem_path(language, stem_dir))
+    return stems
+
+
+def stem_tokens(tokens: dict, language: str, stem_dir=None):
+    # the tokens (see tokens.tokenize) with every word replaced by its stem: only the words that occur are
+    # stemmed, and the token ids become ids into the sorted stem vocabulary in one indexing step
+    used = np.unique(tokens['ids'])
+    stem_ids, stem_vocab = pd.factorize(stems_of(language, tokens['vocab'][used], stem_dir), sort=True)
+    remap = np.full(len(tokens['vocab']), -1, dtype=np.int32)
+    remap[used] = stem_ids
+    return {
+        'vocab': np.asarray(stem_vocab, dtype=object),
+        'indptr': tokens['indptr'],
+        'ids': remap[tokens['ids']]
+        }
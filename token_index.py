@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Persisted inverted index from tokens to tweet ids for ad-hoc topic queries
+
+The vocabulary of the cleaned texts is kept sorted, with one posting list of
+tweet ids per token, so a stem is resolved against the (much smaller)
+vocabulary instead of rescanning every tweet: prefix matches are a binary
+search, substring matches (a stem anywhere inside a word) go through
+an n-gram index over the distinct words (see vocab_index.py). Each tweet's
+day and language are stored with the index, so any new topic list gives its
+posting list and daily prevalence directly. New tweets are appended to an
+index without rebuilding it, so the index of the cached corpus only indexes
+the rows appended to the cache since (see ingest.py).
+"""
+
+import os
+import bisect
+import numpy as np
+import pandas as pd
+from aggregation import daily_counts
+from corpus import corpus_cache_path, corpus_generation, read_corpus_table
+from vocab_index import gram_index, words_containing
+from tokens import corpus_tokens
+
+
+
+def token_pairs(texts):
+    # (token, tweet position) for every distinct token of every whitespace tokenized (cleaned) text
+    tokens = pd.Series(texts).reset_index(drop=True).astype(object).str.split()
+    flat = tokens.explode().dropna()
+    pairs = pd.DataFrame({'token': flat.to_numpy(dtype=object), 'tweet': flat.index.to_numpy(dtype=np.int64)})
+    return pairs.drop_duplicates()
+
+
+def build_index(texts, day_keys, languages):
+    # index for a batch of tweets with ids 0 .. len(texts) - 1; day_keys are yyyymmdd integers
+    pairs = token_pairs(texts)
+    term_ids, vocab = pd.factorize(pairs['token'], sort=True)
+    tweets = pairs['tweet'].to_numpy(dtype=np.int64)
+    order = np.lexsort((tweets, term_ids))
+    lang_codes, lang_names = pd.factorize(pd.Series(languages).astype(object), sort=True)
+    return {
+        'vocab': np.asarray(vocab, dtype=object),
+        'indptr': np.concatenate([[0], np.cumsum(np.bincount(term_ids, minlength=len(vocab)))]).astype(np.int64),
+        'postings': tweets[order],
+        'day': np.asarray(day_keys, dtype=np.int32),
+        'language': lang_codes.astype(np.int8),
+        'languages': list(lang_names)
+        }
+
+
+def tokens_index(tokens: dict, day_keys, languages):
+    # the same index as build_index, from already tokenized texts (see tokens.tokenize):
+    # sorting the distinct (token, tweet) pairs orders the postings by token, then tweet
+    n = len(tokens['indptr']) - 1
+    tweets = np.repeat(np.arange(n, dtype=np.int64), np.diff(tokens['indptr']))
+    pairs = np.unique(tokens['ids'].astype(np.int64) * max(n, 1) + tweets)
+    terms = pairs // max(n, 1)
+    lang_codes, lang_names = pd.factorize(pd.Series(languages).astype(object), sort=True)
+    return {
+        'vocab': tokens['vocab'],
+        'indptr': np.concatenate([[0], np.cumsum(np.bincount(terms, minlength=len(tokens['vocab'])))]).astype(np.int64),
+        'postings': pairs % max(n, 1),
+        'day': np.asarray(day_keys, dtype=np.int32),
+        'language': lang_codes.astype(np.int8),
+        'languages': list(lang_names)
+        }
+
+
+def concat_indexes(parts: list):
+    # one index over the tweets of all parts, in order: tweet ids of later parts are shifted past earlier ones
+    vocab = np.unique(np.concatenate([np.asarray([], dtype=object)] + [p['vocab'] for p in parts]))
+    languages = sorted(set().union(*[p['languages'] for p in parts]))
+    terms, postings, days, langs = [], [], [], []
+    offset = 0
+    for p in parts:
+        remap = np.searchsorted(vocab, p['vocab']).astype(np.int64)
+        terms.append(np.repeat(remap, np.diff(p['indptr'])))
+        postings.append(p['postings'] + offset)
+        lang_remap = np.array([languages.index(lang) for lang in p['languages']], dtype=np.int8)
+        langs.append(lang_remap[p['language']] if len(lang_remap) else p['language'])
+        days.append(p['day'])
+        offset += len(p['day'])
+
+    # within a part postings are sorted by tweet, and parts come in tweet order, so a stable sort by term suffices
+    terms = np.concatenate([np.zeros(0, dtype=np.int64)] + terms)
+    order = np.argsort(terms, kind='stable')
+    return {
+        'vocab': vocab,
+        'indptr': np.concatenate([[0], np.cumsum(np.bincount(terms, minlength=len(vocab)))]).astype(np.int64),
+        'postings': np.concatenate([np.zeros(0, dtype=np.int64)] + postings)[order],
+        'day': np.concatenate([np.zeros(0, dtype=np.int32)] + days),
+        'language': np.concatenate([np.zeros(0, dtype=np.int8)] + langs),
+        'languages': languages
+        }
+
+
+def add_tweets(index: dict, texts, day_keys, languages):
+    # append new tweets (ids continue from the current number of tweets) and return the updated index
+    return concat_indexes([index, build_index(texts, day_keys, languages)])
+
+
+def pack_words(words):
+    # one '\n' joined utf-8 buffer (tokens never contain whitespace) rather than a fixed width
+    # string array, which a single very long token would blow up
+    return np.frombuffer('\n'.join(words).encode('utf-8'), dtype=np.uint8)
+
+
+def unpack_words(buffer, count: int):
+    return np.array(buffer.tobytes().decode('utf-8').split('\n') if count else [], dtype=object)
+
+
+def index_arrays(index: dict, prefix='index_'):
+    # arrays to np.savez, including the vocabulary n-gram index if it has been built
+    arrays = {
+        prefix + 'vocab': pack_words(index['vocab']),
+        prefix + 'indptr': index['indptr'],
+        prefix + 'postings': index['postings'],
+        prefix + 'day': index['day'],
+        prefix + 'language': index['language'],
+        prefix + 'languages': np.array(index['languages'], dtype=str)
+        }
+    if 'grams' in index:
+        arrays[prefix + 'gram_n'] = np.array(index['grams']['n'])
+        arrays[prefix + 'grams'] = pack_words(index['grams']['grams'])
+        arrays[prefix + 'gram_indptr'] = index['grams']['indptr']
+        arrays[prefix + 'gram_words'] = index['grams']['words']
+    return arrays
+
+
+def read_index_arrays(f, prefix='index_'):
+    index = {
+        'vocab': unpack_words(f[prefix + 'vocab'], len(f[prefix + 'indptr']) - 1),
+        'indptr': f[prefix + 'indptr'],
+        'postings': f[prefix + 'postings'],
+        'day': f[prefix + 'day'],
+        'language': f[prefix + 'language'],
+        'languages': f[prefix + 'languages'].tolist()
+        }
+    if prefix + 'grams' in f:
+        index['grams'] = {
+            'n': int(f[prefix + 'gram_n']),
+            'grams': unpack_words(f[prefix + 'grams'], len(f[prefix + 'gram_indptr']) - 1),
+            'indptr': f[prefix + 'gram_indptr'],
+            'words': f[prefix + 'gram_words']
+            }
+    return index
+
+
+def save_index(index: dict, path: str, **extra):
+    tmp = path + ".tmp.npz"
+    np.savez(tmp, **index_arrays(index), **extra)
+    os.replace(tmp, path)
+
+
+def load_index(path: str):
+    with np.load(path) as f:
+        return read_index_arrays(f)
+
+
+def table_days(df: pd.DataFrame):
+    # yyyymmdd day keys of corpus rows
+    return df['year'].astype(np.int64) * 10000 + df['month'].astype(np.int64) * 100 + df['day'].astype(np.int64)
+
+
+def corpus_index(cache_dir="data/cache"):
+    # index over the cached corpus (tweet id = row in the cache, i.e. in corpus.corpus_table); the postings of rows
+    # appended to the cache since it was saved are added to it, and it is only rebuilt, from the shared tokens of
+    # the corpus (see tokens.corpus_tokens), when the cache file has been rewritten (a new generation)
+    cache_path = corpus_cache_path(cache_dir)
+    index_path = os.path.join(cache_dir, "index.npz")
+    st = os.stat(cache_path)
+    source = np.array([st.st_size, st.st_mtime_ns], dtype=np.int64)
+    generation, rows = corpus_generation(cache_path)
+    index = None
+    if os.path.exists(index_path):
+        with np.load(index_path) as f:
+            if 'source' in f and np.array_equal(f['source'], source):
+                return read_index_arrays(f)
+            if 'generation' in f and str(f['generation']) == generation and len(f['index_day']) <= rows:
+                index = read_index_arrays(f)
+
+    table = read_corpus_table(cache_path)
+    if index is None:
+        df = table.select(['language', 'year', 'month', 'day']).to_pandas()
+        index = tokens_index(corpus_tokens(cache_dir), table_days(df), df['language'])
+    else:
+        df = table.slice(len(index['day'])).select(['text', 'language', 'year', 'month', 'day']).to_pandas()
+        index = add_tweets(index, df['text'], table_days(df), df['language'])
+    vocab_grams(index)
+    save_index(index, index_path, source=source, generation=np.array(generation))
+    return index
+
+
+def prefix_terms(index: dict, stem: str):
+    # ids of the vocabulary words starting with stem: a contiguous range of the sorted vocabulary
+    vocab = index['vocab']
+    lo = bisect.bisect_left(vocab, stem)
+    hi = bisect.bisect_right(vocab, stem, lo=lo, key=lambda word: word[:len(stem)])
+    return np.arange(lo, hi, dtype=np.int64)
+
+
+def vocab_grams(index: dict):
+    # n-gram index over the vocabulary, built on first use and kept with the index
+    if 'grams' not in index:
+        index['grams'] = gram_index(index['vocab'])
+    return index['grams']
+
+
+def substring_terms(index: dict, stem: str):
+    # ids of the vocabulary words containing stem anywhere
+    return words_containing(vocab_grams(index), index['vocab'], stem)
+
+
+def matching_terms(index: dict, stem: str, match='substring'):
+    # a stem containing whitespace can never be inside a single token
+    if stem != '' and stem.split() != [stem]:
+        return np.zeros(0, dtype=np.int64)
+    return {'substring': substring_terms, 'prefix': prefix_terms}[match](index, stem)
+
+
+def posting_list(index: dict, stems, match='substring'):
+    # sorted ids of the tweets with a token matching any of the stems
+    if isinstance(stems, str):
+        stems = [stems]
+    indptr, postings = index['indptr'], index['postings']
+    terms = np.unique(np.concatenate([np.zeros(0, dtype=np.int64)] + [matching_terms(index, stem, match) for stem in stems]))
+    return np.unique(np.concatenate([np.zeros(0, dtype=np.int64)] + [postings[indptr[t]:indptr[t + 1]] for t in terms]))
+
+
+def topic_hits(index: dict, topics: dict, match='substring'):
+    # tweets x topics frame of 0/1 indicators, the same as topic_matching.topic_matrix on the indexed texts
+    names = list(topics.keys())
+    hits = np.zeros((len(index['day']), len(names)), dtype=np.uint8)
+    for j, name in enumerate(names):
+        hits[posting_list(index, topics[name], match), j] = 1
+    return pd.DataFrame(hits, columns=names)
+
+
+def index_frame(index: dict):
+    # year, month, day and language of every indexed tweet, in tweet id order
+    day = index['day'].astype(np.int64)
+    return pd.DataFrame({
+        'year': day // 10000,
+        'month': day // 100 % 100,
+        'day': day % 100,
+        'language': np.asarray(index['languages'], dtype=object)[index['language']]
+        })
+
+
+def topic_daily(index: dict, topics: dict, match='substring'):
+    # daily counts (see aggregation.daily_counts) for a topics dict, straight from the index
+    return daily_counts(index_frame(index), topic_hits(index, topics, match))
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tokenized corpus shared by topic_persistence.py and LDA.ipynb
+
+The cleaned texts (lowercase, no punctuation; see preprocessing.clean_text)
+are split into tokens once, and every tweet becomes a run of integer ids into
+one sorted vocabulary (indptr / ids, as in a CSR matrix). Stopwords are a
+frozenset turned into a mask over the vocabulary, so dropping them is one
+array lookup per token instead of a list scan per word. The tokens of the
+cached corpus are stored as Arrow files next to it, memory mapped on later
+loads and only rebuilt when the corpus cache has been rewritten.
+"""
+
+import os
+import json
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from corpus import corpus_cache_path
+from preprocessing import clean_text
+
+
+TOKENS_SCHEMA = pa.schema([
+    ('ids', pa.large_list(pa.int32()))
+    ])
+
+VOCAB_SCHEMA = pa.schema([
+    ('word', pa.string())
+    ])
+
+# stopword lists used in LDA.ipynb, less the words the analysis keeps
+STOPWORD_LANGUAGES = ('russian', 'ukrainian')
+KEEP_WORDS = ('прекрасно', 'прекрасне')
+
+
+
+def load_stopwords(languages=STOPWORD_LANGUAGES, keep=KEEP_WORDS):
+    # frozenset of advertools' stopwords for the given languages (advertools is only needed here)
+    import advertools as adv
+    words = set().union(*[adv.stopwords[language] for language in languages])
+    return frozenset(words - set(keep))
+
+
+def tokenize(texts, cleaned=True):
+    # {'vocab': sorted distinct tokens, 'indptr', 'ids'}: text i is vocab[ids[indptr[i]:indptr[i + 1]]], in order.
+    # On cleaned texts (only word characters and whitespace left) whitespace splitting gives the same
+    # tokens as RegexpTokenizer(r'\w+')
+    if not cleaned:
+        texts = clean_text(texts)
+    tokens = pd.Series(texts).reset_index(drop=True).astype(object).str.split()
+    lengths = tokens.str.len().fillna(0).to_numpy(dtype=np.int64)
+    flat = tokens.explode().dropna()
+    ids, vocab = pd.factorize(flat.to_numpy(dtype=object), sort=True)
+    return {
+        'vocab': np.asarray(vocab, dtype=object),
+        'indptr': np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64),
+        'ids': ids.astype(np.int32)
+        }
+
+
+def concat_tokens(parts: list):
+    # tokens of all parts, one after the other, over the union of their vocabularies
+    vocab = np.unique(np.concatenate([np.asarray([], dtype=object)] + [p['vocab'] for p in parts]))
+    ids, lengths = [np.zeros(0, dtype=np.int32)], [np.zeros(0, dtype=np.int64)]
+    for p in parts:
+        remap = np.searchsorted(vocab, p['vocab']).astype(np.int32)
+        ids.append(remap[p['ids']])
+        lengths.append(np.diff(p['indptr']))
+    return {
+        'vocab': vocab,
+        'indptr': np.concatenate([[0], np.cumsum(np.concatenate(lengths))]).astype(np.int64),
+        'ids': np.concatenate(ids)
+        }
+
+
+def stop_mask(vocab, stopwords: frozenset):
+    # True for the vocabulary words in stopwords
+    return np.fromiter((word in stopwords for word in vocab), dtype=bool, count=len(vocab))
+
+
+def filter_tokens(tokens: dict, stopwords=None, rows=None):
+    # tokens of the tweets at rows (all if None), in that order, without the stopwords; the vocabulary is kept
+    indptr, ids = tokens['indptr'], tokens['ids']
+    if rows is not None:
+        rows = np.asarray(rows, dtype=np.int64)
+        lengths = indptr[rows + 1] - indptr[rows]
+        ends = np.cumsum(lengths)
+        ids = ids[np.repeat(indptr[rows] - (ends - lengths), lengths) + np.arange(ends[-1] if len(ends) else 0)]
+        indptr = np.concatenate([[0], ends]).astype(np.int64)
+    if stopwords:
+        keep = ~stop_mask(tokens['vocab'], stopwords)[ids]
+        tweet = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(tweet[keep], minlength=len(indptr) - 1))]).astype(np.int64)
+        ids = ids[keep]
+    return {'vocab': tokens['vocab'], 'indptr': indptr, 'ids': ids}
+
+
+def token_lists(tokens: dict):
+    # list of token lists, one per tweet (the input gensim's Dictionary and doc2bow expect)
+    if len(tokens['indptr']) <= 1:
+        return []
+    words = tokens['vocab'][tokens['ids']]
+    return [part.tolist() for part in np.split(words, tokens['indptr'][1:-1])]
+
+
+def token_texts(tokens: dict):
+    # the tokens of every tweet joined back into one string
+    return [' '.join(words) for words in token_lists(tokens)]
+
+
+def tokens_paths(cache_dir: str):
+    return os.path.join(cache_dir, "tokens.arrow"), os.path.join(cache_dir, "vocab.arrow")
+
+
+def save_tokens(tokens: dict, cache_dir: str, source: list):
+    # the vocabulary is written first, and the token ids (stamped with the corpus cache they were read
+    # from) last, so fresh token ids always come with their vocabulary
+    tokens_path, vocab_path = tokens_paths(cache_dir)
+    vocab = pa.table({'word': pa.array(tokens['vocab'], pa.string())}, schema=VOCAB_SCHEMA)
+    ids = pa.LargeListArray.from_arrays(pa.array(tokens['indptr'], pa.int64()), pa.array(tokens['ids'], pa.int32()))
+    schema = TOKENS_SCHEMA.with_metadata({'source': json.dumps(source)})
+    for path, table, table_schema in ((vocab_path, vocab, VOCAB_SCHEMA), (tokens_path, pa.table({'ids': ids}, schema=schema), schema)):
+        with pa.OSFile(path + ".tmp", 'wb') as out, pa.ipc.new_file(out, table_schema) as writer:
+            writer.write_table(table)
+        os.replace(path + ".tmp", path)
+
+
+def read_tokens(cache_dir: str):
+    # memory mapped token ids and their vocabulary
+    tokens_path, vocab_path = tokens_paths(cache_dir)
+    ids = pa.ipc.open_file(pa.memory_map(tokens_path, 'r')).read_all().column('ids').combine_chunks()
+    vocab = pa.ipc.open_file(pa.memory_map(vocab_path, 'r')).read_all().column('word')
+    return {
+        'vocab': vocab.to_numpy(zero_copy_only=False).astype(object),
+        'indptr': ids.offsets.to_numpy(),
+        'ids': ids.values.to_numpy()
+        }
+
+
+def read_token_rows(cache_dir: str, start: int, stop: int):
+    # (indptr from 0, token ids) of the tweets [start, stop) of the stored tokens, memory mapped,
+    # without loading the vocabulary
+    tokens_path, _ = tokens_paths(cache_dir)
+    ids = pa.ipc.open_file(pa.memory_map(tokens_path, 'r')).read_all().column('ids').slice(start, stop - start).combine_chunks()
+    offsets = ids.offsets.to_numpy()
+    return offsets - offsets[0], ids.flatten().to_numpy()
+
+
+def tokens_source(cache_dir: str):
+    # the corpus cache the stored tokens were read from, or None if there are none
+    tokens_path, vocab_path = tokens_paths(cache_dir)
+    if not (os.path.exists(tokens_path) and os.path.exists(vocab_path)):
+        return None
+    metadata = pa.ipc.open_file(pa.memory_map(tokens_path, 'r')).schema.metadata or {}
+    return json.loads(metadata[b'source']) if b'source' in metadata else None
+
+
+def corpus_tokens(cache_dir="data/cache"):
+    # tokens of every tweet of the cached corpus (tweet i = row i of corpus.corpus_table), tokenized
+    # one record batch at a time whenever the cache file has been rewritten
+    cache_path = corpus_cache_path(cache_dir)
+    st = os.stat(cache_path)
+    source = [st.st_size, st.st_mtime_ns]
+    if tokens_source(cache_dir) == source:
+        return read_tokens(cache_dir)
+
+    reader = pa.ipc.open_file(pa.memory_map(cache_path, 'r'))
+    parts = [tokenize([])]
+    for i in range(reader.num_record_batches):
+        parts.append(tokenize(reader.get_batch(i).column('text').to_pandas()))
+    tokens = concat_tokens(parts)
+    save_tokens(tokens, cache_dir, source)
+    return tokens
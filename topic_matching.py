@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Topic matching over the stem lists used in topic_persistence.py
+
+Every topic in a topics dict is scored for every tweet at once, giving the
+same 0/1 result as checking every word of a tweet for every stem (`conj in
+word`) for each (tweet, topic) pair. Stems are matched against the distinct
+words of the texts (through the n-gram index of vocab_index.py) rather than
+against every tweet, and a tweet mentions a topic if one of its tokens is
+among the matching words. The words of one vocabulary are matched once: the
+corpus' shared token vocabulary for the whole corpus (see parallel.py), or,
+for a stream of new texts, a table of matched words that only grows by the
+words not seen before (topic_words).
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from vocab_index import gram_index, words_containing
+
+
+
+def token_matrix(texts):
+    # tweets x vocabulary 0/1 occurrence matrix for whitespace tokenized texts, and the vocabulary;
+    # texts may also be tokenized already (see tokens.tokenize, tokens.corpus_tokens)
+    if isinstance(texts, dict):
+        occurs = sparse.csr_matrix((np.ones(len(texts['ids']), dtype=np.int32), texts['ids'], texts['indptr']),
+                                   shape=(len(texts['indptr']) - 1, len(texts['vocab'])))
+        return occurs, texts['vocab']
+    tokens = pd.Series(texts).reset_index(drop=True).astype(object).str.split()
+    lengths = tokens.str.len().fillna(0).to_numpy(dtype=np.int64)
+    flat = tokens.explode().dropna()
+    token_ids, vocab = pd.factorize(flat)
+    indptr = np.concatenate([[0], np.cumsum(lengths)])
+    occurs = sparse.csr_matrix((np.ones(len(token_ids), dtype=np.int32), token_ids, indptr),
+                               shape=(len(tokens), len(vocab)))
+    return occurs, np.asarray(vocab, dtype=object)
+
+
+def vocabulary_topics(vocab, topics: dict, grams=None):
+    # vocabulary x topics 0/1 matrix: word w belongs to a topic if `conj in w` for one of its stems.
+    # A stem containing whitespace can never be inside a word and matches nothing;
+    # the empty stem is inside every word. grams is the n-gram index of vocab if already built
+    if grams is None:
+        grams = gram_index(vocab)
+    member = np.zeros((len(vocab), len(topics)), dtype=np.int32)
+    for j, name in enumerate(topics):
+        for conj in topics[name]:
+            if conj != '' and conj.split() != [conj]:
+                continue
+            member[words_containing(grams, vocab, conj), j] = 1
+    return member
+
+
+def topic_words(topics: dict):
+    # words matched against topics so far (sorted) and their vocabulary x topics rows; see words_topics
+    return {
+        'topics': topics,
+        'vocab': np.zeros(0, dtype=object),
+        'member': np.zeros((0, len(topics)), dtype=np.int32)
+        }
+
+
+def words_topics(matched: dict, vocab):
+    # vocabulary x topics 0/1 matrix for vocab, matching (and adding to matched) only the words not seen before
+    vocab = np.asarray(vocab, dtype=object)
+    new = np.setdiff1d(vocab, matched['vocab'])
+    if len(new):
+        words = np.concatenate([matched['vocab'], new])
+        member = np.concatenate([matched['member'], vocabulary_topics(new, matched['topics'])])
+        order = np.argsort(words, kind='stable')
+        matched['vocab'], matched['member'] = words[order], member[order]
+    return matched['member'][np.searchsorted(matched['vocab'], vocab)]
+
+
+def topic_hits(occurs, member, names: list, index=None):
+    # tweets x topics frame of 0/1 indicators from a tweets x vocabulary occurrence matrix and the
+    # vocabulary x topics membership (dense or sparse)
+    hits = occurs @ member
+    hits = (hits.toarray() if sparse.issparse(hits) else np.asarray(hits)) > 0
+    return pd.DataFrame(hits.astype(np.uint8).reshape(occurs.shape[0], len(names)), columns=names, index=index)
+
+
+def topic_matrix(texts, topics: dict, matched=None):
+    # return a tweets x topics frame of 0/1 indicators, one column per topic (texts or their tokens);
+    # with matched (see topic_words, for the same topics) words already matched before are not matched again
+    index = texts.index if isinstance(texts, pd.Series) else None
+    occurs, vocab = token_matrix(texts)
+    member = vocabulary_topics(vocab, topics) if matched is None else words_topics(matched, vocab)
+    return topic_hits(occurs, member, list(topics.keys()), index)
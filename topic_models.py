@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LDA topic models for the prewar / postwar x Russian / Ukrainian corpora
+
+Each stemmed corpus (see stemming.stem_tokens) is written once to disk as the
+CSR arrays of its documents x words count matrix (.npy files) and loaded
+memory mapped: LDA, coherence and pyLDAvis read documents straight from the
+page cache instead of from Python lists of (id, count) tuples, training
+streams them chunk by chunk, and the corpora survive kernel restarts. Models are trained with gensim's LdaMulticore on all cores
+(workers=1 falls back to the single process LdaModel) and saved under
+config.MODEL_DIR. Newly ingested tweets update a saved model online instead
+of retraining it.
+"""
+
+import os
+import numpy as np
+from scipy import sparse
+from gensim import corpora, models, matutils
+import config
+
+
+
+def bow_matrix(tokens: dict, size=None):
+    # documents x vocabulary token counts (CSR, sorted column ids) for tokenized documents (see tokens.tokenize)
+    # copied, as sum_duplicates sorts and merges the column ids in place
+    counts = sparse.csr_matrix((np.ones(len(tokens['ids']), dtype=np.float32), tokens['ids'], tokens['indptr']),
+                               shape=(len(tokens['indptr']) - 1, size or len(tokens['vocab'])), copy=True)
+    counts.sum_duplicates()
+    return counts
+
+
+def bow_stream(counts):
+    # gensim corpus (one [(word id, count), ...] list per document) over the rows of a CSR matrix
+    return matutils.Sparse2Corpus(counts, documents_columns=False)
+
+
+def corpus_path(name: str, model_dir=None):
+    return os.path.join(model_dir or config.MODEL_DIR, name)
+
+
+BOW_ARRAYS = ('indptr', 'indices', 'data')
+
+
+def write_bow(tokens: dict, name: str, model_dir=None):
+    # write a tokenized corpus to <model_dir>/<name>.{indptr,indices,data}.npy and its dictionary to <name>.dict;
+    # word ids are the positions in the (sorted) vocabulary
+    path = corpus_path(name, model_dir)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    counts = bow_matrix(tokens)
+    # one index dtype for indptr and indices, so scipy never has to convert (copy) the mapped arrays
+    index_dtype = np.int32 if counts.nnz < np.iinfo(np.int32).max else np.int64
+    arrays = {'indptr': counts.indptr.astype(index_dtype), 'indices': counts.indices.astype(index_dtype), 'data': counts.data}
+    for key in BOW_ARRAYS:
+        np.save(path + '.' + key + '.tmp.npy', arrays[key])
+        os.replace(path + '.' + key + '.tmp.npy', path + '.' + key + '.npy')
+    dictionary = corpora.Dictionary.from_corpus(bow_stream(counts), id2word=dict(enumerate(tokens['vocab'])))
+    dictionary.save(path + '.dict')
+    return read_bow(name, model_dir)
+
+
+def read_bow(name: str, model_dir=None):
+    # (corpus, dictionary) as written by write_bow; the corpus is a gensim corpus over the memory mapped
+    # CSR arrays, and corpus.sparse is the words x documents matrix itself (e.g. for pyLDAvis)
+    path = corpus_path(name, model_dir)
+    indptr, indices, data = [np.load(path + '.' + key + '.npy', mmap_mode='r') for key in BOW_ARRAYS]
+    dictionary = corpora.Dictionary.load(path + '.dict')
+    counts = sparse.csr_matrix((data, indices, indptr), shape=(len(indptr) - 1, len(dictionary)), copy=False)
+    return bow_stream(counts), dictionary
+
+
+def train_lda(corpus, dictionary, num_topics=20, workers=None, chunksize=2000, passes=1, random_state=None, name=None,
+              model_dir=None):
+    # LDA trained on a streamed corpus: LdaMulticore with `workers` worker processes (all cores but one by default),
+    # or the single process LdaModel for workers=1; saved to <model_dir>/<name>.lda if a name is given
+    workers = workers or max((os.cpu_count() or 1) - 1, 1)
+    if workers == 1:
+        model = models.LdaModel(corpus=corpus, id2word=dictionary, num_topics=num_topics, chunksize=chunksize,
+                                passes=passes, random_state=random_state)
+    else:
+        model = models.LdaMulticore(corpus=corpus, id2word=dictionary, num_topics=num_topics, workers=workers,
+                                    chunksize=chunksize, passes=passes, random_state=random_state)
+    if name is not None:
+        model.save(corpus_path(name, model_dir) + '.lda')
+    return model
+
+
+def load_lda(name: str, model_dir=None):
+    return models.LdaModel.load(corpus_path(name, model_dir) + '.lda')
+
+
+def dictionary_bow(tokens: dict, dictionary):
+    # CSR counts of tokenized documents over the word ids of an existing dictionary; words it does not know are dropped
+    ids = np.array([dictionary.token2id.get(word, -1) for word in tokens['vocab']], dtype=np.int64)[tokens['ids']]
+    known = ids >= 0
+    doc = np.repeat(np.arange(len(tokens['indptr']) - 1), np.diff(tokens['indptr']))[known]
+    counts = sparse.csr_matrix((np.ones(known.sum(), dtype=np.float32), (doc, ids[known])),
+                               shape=(len(tokens['indptr']) - 1, len(dictionary)))
+    counts.sum_duplicates()
+    return counts
+
+
+def update_lda(model, tokens: dict, chunksize=2000, name=None, model_dir=None):
+    # online update of a trained model with new tokenized documents (e.g. newly ingested postwar tweets),
+    # streamed in chunks; the vocabulary stays the model's, so words it has never seen are left out
+    # LdaMulticore.update takes no chunksize of its own, both read the model's
+    model.chunksize = chunksize
+    model.update(bow_stream(dictionary_bow(tokens, model.id2word)))
+    if name is not None:
+        model.save(corpus_path(name, model_dir) + '.lda')
+    return model
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Topic count selection for the LDA corpora
+
+LDA is trained for every topic count and seed of a grid, each grid point as
+one single process model in a process pool, and every model is scored by
+u_mass and c_v coherence. Both measures only need how often the top words of
+the topics occur, alone and in pairs, in documents (u_mass) or in sliding
+windows of 110 tokens (c_v): these counts are kept for the top words seen so
+far and only grown for new ones, so scoring a model is a few array lookups.
+Models, counts and scores are stored under config.MODEL_DIR in a directory
+named after the hash of the tokenized corpus, and a rerun only trains and
+scores the grid points that are not there yet.
+"""
+
+import os
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from gensim import models
+from topic_models import write_bow, read_bow, train_lda
+import config
+
+
+# c_v's sliding window (as in gensim's CoherenceModel) and gensim's epsilon in the log ratios
+CV_WINDOW = 110
+EPSILON = 1e-12
+
+SCORE_COLUMNS = ['num_topics', 'seed', 'passes', 'chunksize', 'topn', 'u_mass', 'c_v', 'path']
+
+
+
+def tokens_hash(tokens: dict):
+    # sha1 of a tokenized corpus (see tokens.tokenize): its vocabulary and the token ids of every document
+    digest = hashlib.sha1()
+    digest.update('\n'.join(tokens['vocab']).encode('utf-8'))
+    digest.update(np.ascontiguousarray(tokens['indptr'], dtype=np.int64).tobytes())
+    digest.update(np.ascontiguousarray(tokens['ids'], dtype=np.int32).tobytes())
+    return digest.hexdigest()
+
+
+def sweep_dir(tokens: dict, name: str, model_dir=None):
+    return os.path.join(model_dir or config.MODEL_DIR, 'sweeps', name + '-' + tokens_hash(tokens)[:16])
+
+
+def model_file(num_topics: int, seed: int, passes: int, chunksize: int):
+    return 'lda-k%d-s%d-p%d-c%d.lda' % (num_topics, seed, passes, chunksize)
+
+
+def context_matrix(tokens: dict, window=None):
+    # contexts x vocabulary occurrence (CSC, 1 where the word occurs): one context per document, or
+    # for window=w the sliding windows of w tokens of every document (a shorter document is one window)
+    indptr = np.asarray(tokens['indptr'], dtype=np.int64)
+    lengths = np.diff(indptr)
+    if window is None:
+        starts, sizes = indptr[:-1], lengths
+    else:
+        windows = np.maximum(lengths - window + 1, 1)
+        doc = np.repeat(np.arange(len(lengths)), windows)
+        offsets = np.arange(windows.sum()) - np.repeat(np.cumsum(windows) - windows, windows)
+        starts, sizes = indptr[doc] + offsets, np.minimum(lengths[doc], window)
+    ends = np.cumsum(sizes)
+    positions = np.repeat(starts - (ends - sizes), sizes) + np.arange(ends[-1] if len(ends) else 0)
+    occurs = sparse.csr_matrix((np.ones(len(positions), dtype=np.int32), np.asarray(tokens['ids'])[positions],
+                                np.concatenate([[0], ends])), shape=(len(sizes), len(tokens['vocab'])))
+    occurs.sum_duplicates()
+    occurs.data[:] = 1
+    return occurs.tocsc()
+
+
+def empty_stats(contexts: dict):
+    # co-occurrence counts per kind of context: the number of contexts, the number of contexts every word
+    # occurs in, and (for the words in 'words', sorted) the number of contexts every pair occurs in
+    stats = {'words': np.zeros(0, dtype=np.int64)}
+    for kind, occurs in contexts.items():
+        stats[kind + '_n'] = occurs.shape[0]
+        stats[kind + '_df'] = np.asarray(occurs.sum(axis=0)).ravel().astype(np.int64)
+        stats[kind] = np.zeros((0, 0), dtype=np.int64)
+    return stats
+
+
+def grow_stats(stats: dict, contexts: dict, words):
+    # stats covering words as well: only the pairs involving words not counted yet are counted
+    new = np.setdiff1d(np.asarray(words, dtype=np.int64), stats['words'])
+    if not len(new):
+        return stats
+    grown = dict(stats, words=np.union1d(stats['words'], new))
+    old_at = np.searchsorted(grown['words'], stats['words'])
+    new_at = np.searchsorted(grown['words'], new)
+    for kind, occurs in contexts.items():
+        co = np.zeros((len(grown['words']), len(grown['words'])), dtype=np.int64)
+        co[np.ix_(old_at, old_at)] = stats[kind]
+        rows = (occurs[:, new].T @ occurs[:, grown['words']]).toarray()
+        co[new_at, :] = rows
+        co[:, new_at] = rows.T
+        grown[kind] = co
+    return grown
+
+
+def save_stats(stats: dict, path: str):
+    tmp = path + '.tmp.npz'
+    np.savez(tmp, **stats)
+    os.replace(tmp, path)
+
+
+def load_stats(path: str, contexts: dict):
+    # the stored counts, or empty ones if there are none yet
+    if os.path.exists(path):
+        with np.load(path) as f:
+            return {key: f[key] for key in f.files}
+    return empty_stats(contexts)
+
+
+def u_mass(stats: dict, top):
+    # u_mass coherence of every topic (rows of top, word ids by decreasing weight): the mean over the pairs
+    # of a word and each word ranked above it of log((D(w, w*) / N + eps) / (D(w*) / N)) over documents
+    at = np.searchsorted(stats['words'], top)
+    n = float(stats['documents_n'])
+    co = stats['documents'][at[:, :, None], at[:, None, :]] / n
+    df = stats['documents_df'][top][:, None, :] / n
+    with np.errstate(divide='ignore', invalid='ignore'):
+        m = np.where(df > 0, np.log((co + EPSILON) / df), 0.0)
+    below = np.tril(np.ones(top.shape[1:] * 2, dtype=bool), -1)
+    return m[:, below].mean(axis=1)
+
+
+def c_v(stats: dict, top):
+    # c_v coherence of every topic: the mean cosine between the NPMI vector (against all top words of the
+    # topic, over sliding windows) of each top word and the sum of those of all of them
+    at = np.searchsorted(stats['words'], top)
+    n = float(stats['windows_n'])
+    co = stats['windows'][at[:, :, None], at[:, None, :]] / n
+    p = stats['windows_df'][top] / n
+    npmi = np.log((co + EPSILON) / (p[:, :, None] * p[:, None, :])) / -np.log(co + EPSILON)
+    topic = npmi.sum(axis=1, keepdims=True)
+    cos = (npmi * topic).sum(axis=2) / (np.linalg.norm(npmi, axis=2) * np.linalg.norm(topic, axis=2))
+    return cos.mean(axis=1)
+
+
+def top_words(model, topn: int):
+    # word ids of the topn heaviest words of every topic (topics x topn)
+    topics = model.get_topics()
+    return np.argsort(-topics, axis=1, kind='stable')[:, :topn]
+
+
+def sweep_point(job: dict):
+    # train (or load, if already trained) the model of one grid point and return its top words
+    if os.path.exists(job['path']):
+        model = models.LdaModel.load(job['path'])
+    else:
+        corpus, dictionary = read_bow('corpus', job['dir'])
+        model = train_lda(corpus, dictionary, num_topics=job['num_topics'], workers=1, chunksize=job['chunksize'],
+                          passes=job['passes'], random_state=job['seed'])
+        model.save(job['path'])
+    return top_words(model, job['topn'])
+
+
+def read_scores(path: str):
+    if os.path.exists(path):
+        return pd.read_csv(path)
+    return pd.DataFrame(columns=SCORE_COLUMNS)
+
+
+def topic_sweep(tokens: dict, name: str, topic_counts=range(5, 55, 5), seeds=(0, 1, 2), passes=1, chunksize=2000,
+                topn=20, workers=None, model_dir=None):
+    # u_mass and c_v coherence (mean over topics) of LDA models of a tokenized corpus for every topic count
+    # and seed, one row per grid point with the path of its model; models and scores are kept in
+    # <model_dir>/sweeps/<name>-<corpus hash>/, so only grid points not scored there before are trained
+    # (in parallel, one model per worker process) and scored
+    out = sweep_dir(tokens, name, model_dir)
+    scores_path = os.path.join(out, 'scores.csv')
+    if not os.path.exists(os.path.join(out, 'corpus.dict')):
+        write_bow(tokens, 'corpus', out)
+    scores = read_scores(scores_path)
+
+    grid = [(k, seed) for k in topic_counts for seed in seeds]
+    done = set(zip(scores['num_topics'], scores['seed'], scores['passes'], scores['chunksize'], scores['topn']))
+    jobs = [{
+        'dir': out,
+        'path': os.path.join(out, model_file(k, seed, passes, chunksize)),
+        'num_topics': k,
+        'seed': seed,
+        'passes': passes,
+        'chunksize': chunksize,
+        'topn': topn
+        } for k, seed in grid if (k, seed, passes, chunksize, topn) not in done]
+
+    if jobs:
+        workers = workers or os.cpu_count() or 1
+        if workers == 1:
+            tops = list(map(sweep_point, jobs))
+        else:
+            with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+                tops = list(pool.map(sweep_point, jobs))
+
+        contexts = {'documents': context_matrix(tokens), 'windows': context_matrix(tokens, CV_WINDOW)}
+        stats_path = os.path.join(out, 'cooccurrence.npz')
+        stats = grow_stats(load_stats(stats_path, contexts), contexts, np.unique(np.concatenate([t.ravel() for t in tops])))
+        save_stats(stats, stats_path)
+
+        rows = pd.DataFrame([dict(job, u_mass=u_mass(stats, top).mean(), c_v=c_v(stats, top).mean())
+                             for job, top in zip(jobs, tops)])[SCORE_COLUMNS]
+        scores = pd.concat([scores, rows], ignore_index=True) if len(scores) else rows
+        scores.to_csv(scores_path + '.tmp', index=False)
+        os.replace(scores_path + '.tmp', scores_path)
+
+    wanted = pd.DataFrame(grid, columns=['num_topics', 'seed']).assign(passes=passes, chunksize=chunksize, topn=topn)
+    return wanted.merge(scores, on=['num_topics', 'seed', 'passes', 'chunksize', 'topn'], how='left')
+
+
+def best_topic_count(scores: pd.DataFrame, measure='c_v'):
+    # the topic count with the highest coherence, averaged over seeds
+    return int(scores.groupby('num_topics')[measure].mean().idxmax())
+
+
+def best_model(scores: pd.DataFrame, measure='c_v', num_topics=None):
+    # the most coherent model of the best topic count (or of num_topics)
+    num_topics = num_topics or best_topic_count(scores, measure)
+    row = scores[scores['num_topics'] == num_topics].sort_values(measure, ascending=False).iloc[0]
+    return models.LdaModel.load(row['path'])
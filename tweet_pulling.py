@@ -6,12 +6,10 @@ Created on Wed May  4 18:32:13 2022
 @author: khevnaparikh
 """
 import datetime
-from twarc.client2 import Twarc2
-from twarc.expansions import ensure_flattened
-import pandas as pd
+from collector import collect, hourly_windows, page_tweets, read_journal, pending_windows, journaled_handler, write_windows_csv
 
 # Your bearer token here
-t = Twarc2(bearer_token="AAAAAAAAAAAAAAAAAAAAAHDfcAEAAAAAsDj9BLeyK5aPY2kl6JOGGiiKfXw%3DkOilWue9skptf2CVyXe55x9mb8yY5KvIjzyDPit1BSaj8r9wWV")
+bearer_token = "AAAAAAAAAAAAAAAAAAAAAHDfcAEAAAAAsDj9BLeyK5aPY2kl6JOGGiiKfXw%3DkOilWue9skptf2CVyXe55x9mb8yY5KvIjzyDPit1BSaj8r9wWV"
 
 start = datetime.datetime(2022, 2, 17, 0, 0, 0, 0, datetime.timezone.utc)
 end = datetime.datetime(2022, 2, 25, 0, 0, 0, 0, datetime.timezone.utc)
@@ -46,9 +44,9 @@ cities = {
 #     r_str += i + ' OR '
 
 stopwords = {
-    'Ukrainian ': 'але OR нею OR як OR в OR мають OR від OR сказати OR або OR він OR що OR це OR для OR вони OR іншого OR до OR з OR твій OR на OR там OR був OR словом OR ви OR і OR їх OR про OR буде OR кожний OR не OR можна OR ми OR використати OR який OR мав OR один OR всі OR вона OR я OR були OR робити OR коли OR бути OR є OR те OR якщо OR за',
+    'uk': 'але OR нею OR як OR в OR мають OR від OR сказати OR або OR він OR що OR це OR для OR вони OR іншого OR до OR з OR твій OR на OR там OR був OR словом OR ви OR і OR їх OR про OR буде OR кожний OR не OR можна OR ми OR використати OR який OR мав OR один OR всі OR вона OR я OR були OR робити OR коли OR бути OR є OR те OR якщо OR за',
     
-    'Russian': 'использовать OR когда OR в OR от OR как OR были OR был OR кто-то OR для OR это OR до OR их OR если OR там OR на OR с OR его OR и OR делает OR или OR они OR не OR сказал OR что OR он OR все OR вы OR то OR она OR по OR слову OR такие OR я OR есть OR быть OR сказать OR но OR каждый OR мы OR можете',
+    'ru': 'использовать OR когда OR в OR от OR как OR были OR был OR кто-то OR для OR это OR до OR их OR если OR там OR на OR с OR его OR и OR делает OR или OR они OR не OR сказал OR что OR он OR все OR вы OR то OR она OR по OR слову OR такие OR я OR есть OR быть OR сказать OR но OR каждый OR мы OR можете',
         }
 
 
@@ -56,38 +54,39 @@ buckets = {
     'during': (start, end)
     }
 
-tweet_list = [] 
+directory = "/Users/khevnaparikh/Desktop/Test"
+journal_path = directory + "/journal.jsonl"
+parts_dir = directory + "/windows"
+
+# every (city, bucket, hour) window is fetched concurrently and paginated to the end;
+# each page is saved under parts_dir and journaled, so rerunning after a crash only
+# fetches what is missing, starting from the last recorded pagination token
+windows = []
+for city in cities.keys():
+    for bucket in buckets.keys():
+        stopkey = 'uk' if city[0] == 'U' else 'ru'
+        qry = stopwords[stopkey] + " lang:" + stopkey + " place:" + cities[city]
+        for t_0, t_1 in hourly_windows(buckets[bucket][0], buckets[bucket][1]):
+            windows.append({'city': city, 'bucket': bucket, 'query': qry, 'start': t_0, 'end': t_1})
+
+# set to a directory to also keep the gzipped raw api responses
+raw_dir = None
+
+def page_rows(window, page):
+    print("Pulling " + window['city'] + " " + str(window['start']))
+    for tweet in page_tweets(page):
+        yield (tweet['created_at'], tweet['text'], cities[window['city']])
+
+todo = pending_windows(windows, read_journal(journal_path))
+print(str(len(windows) - len(todo)) + " of " + str(len(windows)) + " windows already pulled")
+columns = ['timestamp', 'text', 'location']
+with journaled_handler(journal_path, parts_dir, columns, page_rows, raw_dir) as handle_page:
+    collect(todo, bearer_token, handle_page)
+
 for city in cities.keys():
-    print("Pulling for city: " + str(cities[city]))
     for bucket in buckets.keys():
-        # if bucket == 'prewar' and city == 'U1':
-        #     continue
-        print("Pulling for bucket: " + str(bucket))
-        tweet_timestamp, tweet_text, tweet_location = [], [], []
-        t_0 = buckets[bucket][0]
-        t_1 = t_0 + datetime.timedelta(hours=1)
-        while t_1 <= buckets[bucket][1]:
-            print(t_0)
-            stopkey = 'uk' if city[0] == 'U' else 'ru'
-            qry = stopwords[stopkey] + " lang:" + stopkey + " place:" + cities[city]
-            search_results = t.search_all(query=qry, start_time = t_0, end_time = t_1)
-            for page in search_results:
-                for tweet in ensure_flattened(page):
-                    tweet_list.append(tweet)
-                    tweet_timestamp.append(tweet['created_at'])
-                    tweet_text.append(tweet['text'])
-                    tweet_location.append(cities[city])
-                break
-            t_0 = t_0 + datetime.timedelta(hours=1)
-            t_1 = t_1 + datetime.timedelta(hours=1)
-        df_out = pd.DataFrame({
-            'timestamp': tweet_timestamp,
-            'text': tweet_text,
-            'location': tweet_location
-            })
-        directory = "/Users/khevnaparikh/Desktop/Test"
         path = directory + "/" + str(city) + str(bucket) + ".csv"
-        df_out.to_csv(path)
+        write_windows_csv(parts_dir, [w for w in windows if w['city'] == city and w['bucket'] == bucket], columns, path)
             
 
 #,  place_fields=[cities[city]]
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+N-gram index over a vocabulary of distinct words, for substring stem matching
+
+Topic stems match anywhere inside a word (`conj in word`), so
+stems like 'бак' or 'мам' hit in the middle of words and a sorted vocabulary
+alone (prefix search) is not enough. Every substring of up to three
+characters of every word is indexed; a stem of up to three characters is a
+direct lookup, and a longer one is checked only against the words holding all
+of its trigrams. Matching then costs in proportion to the vocabulary, not to
+the number of tokens in the corpus.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+
+def word_grams(word: str, n: int):
+    # distinct substrings of word of length 1 .. n
+    return {word[i:i + k] for k in range(1, n + 1) for i in range(len(word) - k + 1)}
+
+
+def gram_index(vocab, n=3):
+    # {'n', 'grams' (sorted), 'indptr', 'words'}: the ids of the words containing grams[g]
+    # are words[indptr[g]:indptr[g + 1]], in increasing order
+    grams, words = [], []
+    for i, word in enumerate(vocab):
+        found = word_grams(word, n)
+        grams.extend(found)
+        words.extend([i] * len(found))
+    gram_ids, gram_names = pd.factorize(pd.Series(grams, dtype=object), sort=True)
+    words = np.asarray(words, dtype=np.int64)
+    order = np.lexsort((words, gram_ids))
+    return {
+        'n': n,
+        'grams': np.asarray(gram_names, dtype=object),
+        'indptr': np.concatenate([[0], np.cumsum(np.bincount(gram_ids, minlength=len(gram_names)))]).astype(np.int64),
+        'words': words[order]
+        }
+
+
+def gram_words(grams: dict, gram: str):
+    # ids of the words containing gram (len(gram) <= grams['n'])
+    g = np.searchsorted(grams['grams'], gram)
+    if g == len(grams['grams']) or grams['grams'][g] != gram:
+        return np.zeros(0, dtype=np.int64)
+    return grams['words'][grams['indptr'][g]:grams['indptr'][g + 1]]
+
+
+def words_containing(grams: dict, vocab, stem: str):
+    # ids of the vocabulary words w with `stem in w`, exactly
+    if stem == '':
+        return np.arange(len(vocab), dtype=np.int64)
+    n = grams['n']
+    if len(stem) <= n:
+        return gram_words(grams, stem)
+    # candidates hold every n-gram of the stem; intersect starting from the rarest, then verify
+    lists = sorted((gram_words(grams, gram) for gram in {stem[i:i + n] for i in range(len(stem) - n + 1)}), key=len)
+    candidates = lists[0]
+    for ids in lists[1:]:
+        if len(candidates) == 0:
+            break
+        candidates = np.intersect1d(candidates, ids, assume_unique=True)
+    return np.array([i for i in candidates.tolist() if stem in vocab[i]], dtype=np.int64)